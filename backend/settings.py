@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -25,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    'diagnosis.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -33,6 +37,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'diagnosis.db_routers.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -55,18 +60,48 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
-# Database
+# 'asgi' when served by backend/asgi.py; decides the default connection lifetime below
+SERVER_INTERFACE = os.environ.get('DJANGO_SERVER_INTERFACE', 'wsgi')
+
+# Database (the defaults are the local development MySQL server)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'vetmashinanidb',
-        'USER': 'root',
-        'PASSWORD': '',
-        'HOST': 'localhost',
-        'PORT': '3306',
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.mysql'),
+        'NAME': os.environ.get('DB_NAME', 'vetmashinanidb'),
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '3306'),
+        # Seconds to keep connections open between requests; DB_CONN_MAX_AGE overrides it.
+        # WSGI workers reuse a connection for a minute. Under ASGI (notification-stream/, the
+        # async login and signup views) sync code runs in per-request threads, and persistent
+        # connections on those threads leak, so backend/asgi.py sets DJANGO_SERVER_INTERFACE
+        # and connections close after each request. Pooling is left to an external pooler
+        # (ProxySQL, PgBouncer) in front of the database. Connections are pinged before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0' if SERVER_INTERFACE == 'asgi' else '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica for the views marked @read_only_view. Unset variables fall
+# back to the primary's values, so two local SQLite files only need DB_REPLICA_NAME
+# (migrations skip the replica: copy the migrated primary file to create it).
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_DATABASE_ALIAS = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['diagnosis.db_routers.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write (cover replica lag)
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', '5'))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -96,6 +131,63 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # This is where collectstatic will store files
 
+# Trained disease model, written by `manage.py train_model` and hot-reloaded by the views
+DISEASE_MODEL_PATH = os.path.join(BASE_DIR, 'diagnosis', 'model.bin')
+
+# Training metrics and measured latency of the model above, written alongside it by `train_model`
+DISEASE_MODEL_CARD_PATH = os.path.join(BASE_DIR, 'diagnosis', 'model.card.json')
+
+# Limits `train_model` picks its hyperparameters within: single-row p99 predict latency of the
+# compiled artifact, and the artifact's size on disk
+DISEASE_MODEL_LATENCY_BUDGET_MS = 1.0
+DISEASE_MODEL_SIZE_BUDGET_MB = 16
+
+# Number of symptom combinations whose predictions are kept in memory per worker
+PREDICTION_CACHE_SIZE = 4096
+
+# Seconds before a worker's in-memory k-nearest vet index is rebuilt even without a
+# local invalidation (locations changed through other workers)
+VET_INDEX_MAX_AGE = 300
+
+# Notification streaming (notification-stream/, served over ASGI). The broker only
+# wakes streams in the process that publishes. Notifications are created by the separate
+# deliver_notifications process, so with InProcessBroker open streams see them through
+# their database poll, within NOTIFICATION_STREAM_POLL_SECONDS (plus the worker's own
+# --interval). Swap in a cross-process broker to push them immediately.
+NOTIFICATION_BROKER = 'diagnosis.pubsub.InProcessBroker'
+NOTIFICATION_STREAM_POLL_SECONDS = 1
+NOTIFICATION_STREAM_KEEPALIVE = 15
+NOTIFICATION_STREAM_MAX_SECONDS = 300
+NOTIFICATION_STREAM_RETRY_MS = 3000
+
+# Number of PlatformCoinShard rows platform credits and debits are spread over
+PLATFORM_COIN_SHARDS = 16
+
+# Seconds a stored Idempotency-Key response is replayed before it expires
+# (pruned by `manage.py prune_idempotency_keys`)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Threads per worker that hash passwords for signup/ and the login views, and how many
+# more requests may wait for one before the rest are answered 503 (0 = no limit)
+PASSWORD_HASHING_WORKERS = min(4, os.cpu_count() or 1)
+PASSWORD_HASHING_MAX_QUEUE = 64
+
+# Per-worker cache by default; point at Redis or Memcached to share entries across workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vetmashinani',
+    }
+}
+
+# Seconds an account-summary/ response is cached when no write invalidates it first.
+# Writes only invalidate the cache of the worker that made them, so with LocMemCache the
+# other workers can serve balances up to this old; a shared backend removes that
+ACCOUNT_SUMMARY_CACHE_TTL = 60
+
+# Seconds a username's id, role flags and location stay cached for the read views
+USER_RESOLVER_CACHE_TTL = 300
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -103,3 +195,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:4200",  # Angular frontend
 ]
+
+# Paginated listings return the cursor for the next page in this header
+CORS_EXPOSE_HEADERS = [
+    "X-Next-Cursor",
+    "Idempotent-Replayed",
+]
+
+# Mobile clients send Idempotency-Key on retried payment and booking requests
+CORS_ALLOW_HEADERS = [
+    *default_headers,
+    "idempotency-key",
+]
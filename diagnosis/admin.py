@@ -1,8 +1,8 @@
 from django.contrib import admin
-from diagnosis.models import User, CertifiedVet, VeterinarianProfile, FarmerProfile, Appointment, Notification, Favorite, CoinReward, PlatformCoin
+from diagnosis.models import User, CertifiedVet, VeterinarianProfile, FarmerProfile, Appointment, Notification, NotificationOutbox, Favorite, CoinReward, PlatformCoin, PlatformCoinShard, CoinTransaction, IdempotencyKey
 
 # List of all the models you want to register
-models = [User,CertifiedVet, VeterinarianProfile, FarmerProfile, Appointment, Notification, Favorite,CoinReward,PlatformCoin]
+models = [User,CertifiedVet, VeterinarianProfile, FarmerProfile, Appointment, Notification, NotificationOutbox, Favorite,CoinReward,PlatformCoin,PlatformCoinShard,CoinTransaction,IdempotencyKey]
 
 # Loop through the models and register them in the admin site
 for model in models:
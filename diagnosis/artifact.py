@@ -0,0 +1,251 @@
+"""
+Versioned, memory-mappable artifact format for the disease model.
+
+Layout of an artifact file:
+
+    magic (8 bytes) | schema version (uint32) | header length (uint32)
+    JSON header (metadata + array table) | zero padding
+    array buffers, each aligned to ALIGNMENT bytes
+
+The forest is stored as flat node arrays shared by all trees, so a loaded
+artifact is just a set of read-only views into one np.memmap. Every worker
+on a host that maps the same file shares a single physical copy of it.
+
+The StandardScaler used in training is folded into the split thresholds
+when the forest is exported, so raw 0/1 symptom rows are evaluated
+directly and no scaling happens at request time.
+"""
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'VMDXMDL\x00'
+SCHEMA_VERSION = 2
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct('<8sII')
+
+# name -> dtype of every array an artifact must contain
+ARRAY_DTYPES = {
+    'roots': np.int32,
+    'left': np.int32,
+    'right': np.int32,
+    'feature': np.int32,
+    'threshold': np.float64,
+    'value': np.float64,
+}
+
+
+class ArtifactError(ValueError):
+    pass
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def export_forest(model, scaler=None):
+    """
+    Flatten the trees of a fitted RandomForestClassifier into shared node arrays.
+
+    With ``scaler`` the thresholds are mapped back into unscaled feature
+    space: ``(x - mean) / scale <= t`` is the same test as
+    ``x <= t * scale + mean`` because StandardScaler's scale is positive.
+    """
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        node_ids = np.arange(n_nodes, dtype=np.int32)
+        is_leaf = tree.children_left == -1
+        tree_feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+        tree_threshold = np.where(is_leaf, 0.0, tree.threshold)
+        if scaler is not None:
+            # Split thresholds sit between the scaled 0 and 1 values of a symptom, so
+            # the folded threshold lands strictly between 0 and 1 for binary rows
+            tree_threshold = tree_threshold * scaler.scale_[tree_feature] + scaler.mean_[tree_feature]
+
+        # Leaves point at themselves so rows can keep stepping once they land
+        tree_left = np.where(is_leaf, node_ids, tree.children_left).astype(np.int32) + offset
+        tree_right = np.where(is_leaf, node_ids, tree.children_right).astype(np.int32) + offset
+
+        tree_value = tree.value[:, 0, :]
+        totals = tree_value.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1
+
+        roots.append(offset)
+        left.append(tree_left)
+        right.append(tree_right)
+        feature.append(tree_feature)
+        threshold.append(tree_threshold)
+        value.append(tree_value / totals)
+
+        max_depth = max(max_depth, int(tree.max_depth))
+        offset += n_nodes
+
+    arrays = {
+        'roots': np.asarray(roots, dtype=np.int32),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'value': np.concatenate(value),
+    }
+    return arrays, max_depth
+
+
+def save_artifact(path, model, scaler, feature_columns, disease_mapping):
+    """
+    Write the model to ``path`` atomically and return the artifact version.
+
+    The file is written next to the destination and renamed into place, so
+    a worker hot-reloading the artifact never maps a half-written file.
+    """
+    arrays, max_depth = export_forest(model, scaler)
+
+    digest = hashlib.sha256()
+    table = {}
+    offset = 0
+    for name, dtype in ARRAY_DTYPES.items():
+        array = np.ascontiguousarray(arrays[name], dtype=dtype)
+        arrays[name] = array
+        digest.update(array.tobytes())
+        table[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+
+    header = {
+        'schema_version': SCHEMA_VERSION,
+        'version': digest.hexdigest()[:12],
+        'feature_columns': list(feature_columns),
+        'disease_mapping': {name: int(idx) for name, idx in disease_mapping.items()},
+        'classes': [int(c) for c in model.classes_],
+        'n_trees': len(model.estimators_),
+        'max_depth': max_depth,
+        'arrays': table,
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, SCHEMA_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name in ARRAY_DTYPES:
+            f.seek(data_start + table[name]['offset'])
+            f.write(arrays[name].tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+    return header['version']
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            raise ArtifactError("Model artifact is truncated.")
+
+        magic, schema_version, header_len = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ArtifactError("File is not a disease model artifact.")
+        if schema_version != SCHEMA_VERSION:
+            raise ArtifactError(
+                f"Unsupported model artifact schema version {schema_version} (expected {SCHEMA_VERSION})."
+            )
+
+        header_bytes = f.read(header_len)
+        if len(header_bytes) != header_len:
+            raise ArtifactError("Model artifact is truncated.")
+
+    header = json.loads(header_bytes)
+    header['data_start'] = _align(_PREAMBLE.size + header_len)
+    return header
+
+
+def _validate_features(header, expected_features):
+    feature_columns = header['feature_columns']
+    if not feature_columns or not all(isinstance(name, str) for name in feature_columns):
+        raise ArtifactError("Model artifact has an invalid feature list.")
+    if len(set(feature_columns)) != len(feature_columns):
+        raise ArtifactError("Model artifact feature list contains duplicates.")
+    if expected_features is not None and list(expected_features) != feature_columns:
+        raise ArtifactError("Model artifact feature list does not match the expected features.")
+
+
+class ForestArtifact:
+    """Read-only, memory-mapped view of a saved disease model."""
+
+    def __init__(self, path, expected_features=None):
+        header = read_header(path)
+        _validate_features(header, expected_features)
+
+        self.path = path
+        self.version = header['version']
+        self.feature_columns = header['feature_columns']
+        self.disease_mapping = header['disease_mapping']
+        self.classes = np.asarray(header['classes'])
+        self.n_trees = header['n_trees']
+        self.max_depth = header['max_depth']
+
+        self._mmap = np.memmap(path, dtype=np.uint8, mode='r')
+        data_start = header['data_start']
+        for name, dtype in ARRAY_DTYPES.items():
+            spec = header['arrays'].get(name)
+            if spec is None or np.dtype(spec['dtype']) != np.dtype(dtype):
+                raise ArtifactError(f"Model artifact array '{name}' is missing or has the wrong type.")
+            count = int(np.prod(spec['shape']))
+            start = data_start + spec['offset']
+            if start + count * np.dtype(dtype).itemsize > self._mmap.size:
+                raise ArtifactError("Model artifact is truncated.")
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=start)
+            setattr(self, name, array.reshape(spec['shape']))
+
+        n_features = len(self.feature_columns)
+        if self.feature.size and int(self.feature.max()) >= n_features:
+            raise ArtifactError("Model artifact references features outside its feature list.")
+        if self.value.shape[1] != len(self.classes) or len(self.roots) != self.n_trees:
+            raise ArtifactError("Model artifact tree arrays are inconsistent.")
+
+    def predict_proba(self, X):
+        # Rows are raw symptom vectors; scaling is already folded into the thresholds
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[0] == 1:
+            return self._predict_proba_row(X[0])[None, :]
+
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            next_node = np.where(go_left, self.left[node], self.right[node])
+            # Leaves point at themselves, so nothing moving means every row is done
+            if np.array_equal(next_node, node):
+                break
+            node = next_node
+
+        return self.value[node].sum(axis=1) / self.n_trees
+
+    def _predict_proba_row(self, x):
+        # For a single row it is cheaper to resolve every split in one pass and
+        # then only chase successor pointers than to gather level by level
+        successor = np.where(x[self.feature] <= self.threshold, self.left, self.right)
+        node = successor[self.roots]
+
+        for _ in range(self.max_depth):
+            next_node = successor[node]
+            if np.array_equal(next_node, node):
+                break
+            node = next_node
+
+        return self.value[node].sum(axis=0) / self.n_trees
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
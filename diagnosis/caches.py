@@ -0,0 +1,57 @@
+"""
+Per-user account summaries kept in the Django cache.
+
+The write paths that move money or book or update appointments call
+invalidate_account_summaries() inside their transaction; the entries are
+dropped once it commits, so a reader never re-caches values from before
+the change. ACCOUNT_SUMMARY_CACHE_TTL bounds how stale a summary can get
+after writes that bypass these paths (the admin, shell scripts).
+
+Invalidation only reaches the cache of the process that made the write
+unless CACHES points at a shared backend such as Redis or Memcached. With
+the default per-process LocMemCache, a deposit handled by one worker
+leaves the other workers' entries stale for up to the TTL. The unread
+notification count is therefore not cached at all: notifications are
+delivered by the deliver_notifications process, which could never clear
+the web workers' entries.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+
+from .models import Appointment, CoinReward, Notification, User
+
+
+def account_summary_key(user_id):
+    return f'account-summary:{user_id}'
+
+
+def build_account_summary(user_id):
+    # Read from the primary by default: a lagging replica's values would stay cached for the whole TTL
+    user = User.objects.using(DEFAULT_DB_ALIAS).only('wallet_balance').get(id=user_id)
+    coins = CoinReward.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).values_list('coins', flat=True).first()
+    return {
+        'wallet_balance': user.wallet_balance,
+        'coin_balance': coins or 0,
+        'pending_appointments': Appointment.objects.using(DEFAULT_DB_ALIAS).filter(
+            Q(farmer_id=user_id) | Q(vet_id=user_id), status='pending'
+        ).count(),
+    }
+
+
+def get_account_summary(user_id):
+    key = account_summary_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_account_summary(user_id)
+        cache.set(key, summary, settings.ACCOUNT_SUMMARY_CACHE_TTL)
+    # Counted on every call from the (recipient, is_read, created_at) index
+    unread = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    return {**summary, 'unread_notifications': unread}
+
+
+def invalidate_account_summaries(user_ids):
+    keys = [account_summary_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
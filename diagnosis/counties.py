@@ -0,0 +1,43 @@
+# Kenyan county centroids used to place generated users, with 2019 census
+# populations (thousands) to weight how many users each county gets.
+# Plain data with no Django imports, so scripts in data/ can use it directly.
+COUNTIES = [
+    {'county': 'Nairobi', 'lat': -1.2921, 'lng': 36.8219, 'population': 4397},
+    {'county': 'Mombasa', 'lat': -4.0435, 'lng': 39.6682, 'population': 1208},
+    {'county': 'Kisumu', 'lat': -0.0917, 'lng': 34.7680, 'population': 1155},
+    {'county': 'Nakuru', 'lat': -0.3031, 'lng': 36.0800, 'population': 2162},
+    {'county': 'Kisii', 'lat': -0.6767, 'lng': 34.7680, 'population': 1266},
+    {'county': 'Nyeri', 'lat': -0.4195, 'lng': 36.9500, 'population': 759},
+    {'county': 'Meru', 'lat': 0.0473, 'lng': 37.6410, 'population': 1545},
+    {'county': 'Bomet', 'lat': -0.9142, 'lng': 35.0500, 'population': 875},
+    {'county': 'Garissa', 'lat': -0.4543, 'lng': 39.6615, 'population': 841},
+    {'county': 'Homa Bay', 'lat': -0.5364, 'lng': 34.8977, 'population': 1131},
+    {'county': 'Isiolo', 'lat': 0.3501, 'lng': 37.5884, 'population': 268},
+    {'county': 'Kajiado', 'lat': -1.7004, 'lng': 36.7764, 'population': 1117},
+    {'county': 'Kakamega', 'lat': 0.2834, 'lng': 34.7514, 'population': 1867},
+    {'county': 'Kiambu', 'lat': -1.0167, 'lng': 36.9833, 'population': 2417},
+    {'county': 'Kilifi', 'lat': -3.1214, 'lng': 39.9251, 'population': 1453},
+    {'county': 'Kirinyaga', 'lat': -0.9499, 'lng': 37.2260, 'population': 610},
+    {'county': 'Kitui', 'lat': -1.3580, 'lng': 38.0204, 'population': 1136},
+    {'county': 'Laikipia', 'lat': -0.0769, 'lng': 36.8580, 'population': 518},
+    {'county': 'Lamu', 'lat': -2.2630, 'lng': 40.5158, 'population': 143},
+    {'county': 'Machakos', 'lat': -1.5167, 'lng': 37.2878, 'population': 1421},
+    {'county': 'Mandera', 'lat': 3.1428, 'lng': 41.8831, 'population': 867},
+    {'county': 'Marsabit', 'lat': 2.3378, 'lng': 37.9967, 'population': 459},
+    {'county': 'Migori', 'lat': -1.0667, 'lng': 34.5033, 'population': 1116},
+    {'county': 'Murang’a', 'lat': -0.7167, 'lng': 37.2583, 'population': 1056},
+    {'county': 'Nandi', 'lat': 0.1667, 'lng': 35.0475, 'population': 885},
+    {'county': 'Narok', 'lat': -1.0908, 'lng': 35.8172, 'population': 1157},
+    {'county': 'Nyamira', 'lat': -0.5534, 'lng': 34.9660, 'population': 605},
+    {'county': 'Samburu', 'lat': 1.1598, 'lng': 36.5884, 'population': 310},
+    {'county': 'Siaya', 'lat': -0.0717, 'lng': 34.4365, 'population': 993},
+    {'county': 'Taita Taveta', 'lat': -3.4176, 'lng': 38.2027, 'population': 341},
+    {'county': 'Tana River', 'lat': -2.0011, 'lng': 39.6833, 'population': 316},
+    {'county': 'Tharaka Nithi', 'lat': -0.3975, 'lng': 37.6300, 'population': 393},
+    {'county': 'Trans Nzoia', 'lat': 1.0428, 'lng': 35.0208, 'population': 990},
+    {'county': 'Turkana', 'lat': 3.2892, 'lng': 35.6927, 'population': 926},
+    {'county': 'Uasin Gishu', 'lat': 0.5167, 'lng': 35.2690, 'population': 1163},
+    {'county': 'Vihiga', 'lat': -0.0667, 'lng': 34.7313, 'population': 590},
+    {'county': 'Wajir', 'lat': 1.7500, 'lng': 40.0700, 'population': 781},
+    {'county': 'West Pokot', 'lat': 1.7271, 'lng': 35.1057, 'population': 621},
+]
@@ -0,0 +1,89 @@
+"""
+Read replica routing.
+
+Views wrapped in @read_only_view send their reads to the replica
+configured as REPLICA_DATABASE_ALIAS. Everything else, and every write, uses
+the primary. Reads go back to the primary for the rest of a request once it
+has written ("read your writes"). ReplicaPinMiddleware also sets a
+short-lived cookie after a write, so the same client's next requests keep
+reading from the primary until the replica has caught up.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'use_primary_db'
+
+_read_only = ContextVar('read_only', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = settings.REPLICA_DATABASE_ALIAS
+        if replica and _read_only.get() and not (_pinned.get() or _wrote.get()):
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db != settings.REPLICA_DATABASE_ALIAS
+
+
+def read_only_view(view):
+    """Let GET and HEAD requests to ``view`` read from the replica."""
+    if iscoroutinefunction(view):
+        async def wrapper(request, *args, **kwargs):
+            token = _read_only.set(request.method in ('GET', 'HEAD'))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_only.reset(token)
+        markcoroutinefunction(wrapper)
+    else:
+        def wrapper(request, *args, **kwargs):
+            token = _read_only.set(request.method in ('GET', 'HEAD'))
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _read_only.reset(token)
+    return wraps(view)(wrapper)
+
+
+def _begin(request):
+    return _pinned.set(PIN_COOKIE in request.COOKIES), _wrote.set(False)
+
+
+def _finish(response, tokens):
+    pinned_token, wrote_token = tokens
+    if _wrote.get() and settings.REPLICA_DATABASE_ALIAS:
+        response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+    _wrote.reset(wrote_token)
+    _pinned.reset(pinned_token)
+    return response
+
+
+@sync_and_async_middleware
+def ReplicaPinMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            tokens = _begin(request)
+            return _finish(await get_response(request), tokens)
+    else:
+        def middleware(request):
+            tokens = _begin(request)
+            return _finish(get_response(request), tokens)
+    return middleware
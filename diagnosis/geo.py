@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distances in km from one point to arrays of points."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle around a point.
+
+    The longitude bounds are None when the box would wrap around a pole or
+    the antimeridian, in which case only latitude can be used to prefilter.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None, None
+
+    # Longitude half-width of the circle, measured at its tangent points
+    dlng = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits = bits * 2
+            bounds[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """Height and width of a geohash cell in degrees as (dlat, dlng)."""
+    n_bits = 5 * precision
+    lat_bits = n_bits // 2
+    lng_bits = n_bits - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def geohash_neighbourhood(lat, lng, precision):
+    """The geohash cell containing a point plus its (up to) eight neighbours."""
+    dlat, dlng = geohash_cell_size(precision)
+    # Step from the centre of the cell so rounding never skips a neighbour
+    center_lat = (math.floor((lat + 90) / dlat) + 0.5) * dlat - 90
+    center_lng = (math.floor((lng + 180) / dlng) + 0.5) * dlng - 180
+
+    cells = set()
+    for row in (-1, 0, 1):
+        cell_lat = center_lat + row * dlat
+        if not -90 < cell_lat < 90:
+            continue
+        for col in (-1, 0, 1):
+            cell_lng = (center_lng + col * dlng + 180) % 360 - 180
+            cells.add(geohash_encode(cell_lat, cell_lng, precision))
+    return sorted(cells)
+
+
+def geohash_search_cells(lat, lng, radius_km):
+    """
+    Geohash prefixes that together cover a circle around a point.
+
+    Uses the finest precision whose cells are at least ``radius_km`` tall
+    and wide, so the containing cell and its neighbours enclose the circle.
+    Returns None when the circle is too large for a 3x3 block of cells.
+    """
+    dlat_km = radius_km / KM_PER_DEGREE_LAT
+    # Cells are narrowest at the circle's edge farthest from the equator
+    widest_lat = min(abs(lat) + dlat_km, 89.9)
+    km_per_degree_lng = KM_PER_DEGREE_LAT * math.cos(math.radians(widest_lat))
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        dlat, dlng = geohash_cell_size(precision)
+        if dlat * KM_PER_DEGREE_LAT >= radius_km and dlng * km_per_degree_lng >= radius_km:
+            return geohash_neighbourhood(lat, lng, precision)
+    return None
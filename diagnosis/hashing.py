@@ -0,0 +1,100 @@
+"""
+Bounded pool for password hashing in async views.
+
+PBKDF2 takes hundreds of milliseconds per call. Run inline it blocks the
+event loop, and every other request on the worker stalls behind a burst of
+logins. The pool runs hashes on PASSWORD_HASHING_WORKERS threads. hashlib
+releases the GIL while it hashes, so the threads really run in parallel.
+At most PASSWORD_HASHING_MAX_QUEUE more calls may wait for a thread. Calls
+beyond that raise HashingPoolBusy so the view can shed load instead of
+queueing without bound.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class HashingPoolBusy(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._queued = 0
+        self._running = 0
+        self._peak_queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+
+    def _get_executor(self):
+        # Created on first use so pre-forking servers don't share threads across workers
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing'
+                    )
+        return self._executor
+
+    def _run(self, func, args, submitted_at):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_seconds += time.monotonic() - submitted_at
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, func, *args):
+        executor = self._get_executor()
+        with self._lock:
+            max_queue = settings.PASSWORD_HASHING_MAX_QUEUE
+            # Calls that will start straight away don't count against the queue limit
+            waiting = self._queued + self._running - settings.PASSWORD_HASHING_WORKERS
+            if max_queue and waiting >= max_queue:
+                self._rejected += 1
+                raise HashingPoolBusy("Too many password checks in progress.")
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+
+        future = executor.submit(self._run, func, args, time.monotonic())
+        future.add_done_callback(self._release_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _release_if_cancelled(self, future):
+        # A request that went away before its turn never reached _run()
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    async def make_password(self, password):
+        return await self.run(hashers.make_password, password)
+
+    async def check_password(self, password, encoded):
+        return await self.run(hashers.check_password, password, encoded)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': settings.PASSWORD_HASHING_WORKERS,
+                'max_queue': settings.PASSWORD_HASHING_MAX_QUEUE,
+                'queued': self._queued,
+                'running': self._running,
+                'peak_queued': self._peak_queued,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'wait_seconds_total': self._wait_seconds,
+            }
+
+
+hashing_pool = HashingPool()
@@ -0,0 +1,104 @@
+"""
+Idempotency-Key support for endpoints that move money or create records.
+
+The first POST with a given key runs the view and stores its response;
+retries with the same key and body are answered from the stored response
+with a single indexed lookup instead of charging again.
+
+Claiming the key, running the view and storing the response happen in one
+transaction. A concurrent retry blocks on the unique index until the first
+request commits and then replays its response. If the worker dies part
+way, the whole transaction rolls back and the key is free again. Server
+errors roll back too, along with anything the view wrote, so they can be
+retried.
+"""
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _replay(record):
+    response = HttpResponse(bytes(record.response_body), status=record.status_code, content_type=record.content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _answer_existing(record, request_hash):
+    if record.request_hash != request_hash:
+        return JsonResponse({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request.'}, status=422)
+    if record.status_code is None:
+        return JsonResponse({'error': f'A request with this {IDEMPOTENCY_HEADER} is still being processed.'}, status=409)
+    return _replay(record)
+
+
+def idempotent(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method != 'POST' or not key:
+            return view(request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters.'}, status=400)
+
+        scope = view.__name__
+        request_hash = hashlib.sha256(request.body).hexdigest()
+        cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is not None:
+            if record.created_at >= cutoff:
+                return _answer_existing(record, request_hash)
+            record.delete()  # Expired but not pruned yet
+
+        with transaction.atomic():
+            try:
+                # Savepoint, so a lost race doesn't break the outer transaction
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(scope=scope, key=key, request_hash=request_hash)
+            except IntegrityError:
+                record = None
+
+            if record is not None:
+                response = view(request, *args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                    return response
+                if response.streaming:
+                    record.delete()
+                    return response
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    status_code=response.status_code,
+                    content_type=response.get('Content-Type', ''),
+                    response_body=response.content,
+                )
+                return response
+
+        # Another request holding the key has committed by the time the insert fails
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            return JsonResponse({'error': f'A request with this {IDEMPOTENCY_HEADER} is still being processed.'}, status=409)
+        return _answer_existing(record, request_hash)
+
+    return wrapper
+
+
+def prune_expired(batch_size=1000):
+    """Delete keys older than IDEMPOTENCY_KEY_TTL in batches; return how many were removed."""
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    removed = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
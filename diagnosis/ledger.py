@@ -0,0 +1,62 @@
+"""
+Atomic coin movements.
+
+Balances are changed with conditional UPDATE ... SET coins = coins +/- n
+statements, so the balance check and the write are a single row
+operation. Concurrent bookings can't lose updates and no read-modify-write
+round trip is needed. Every movement is recorded in CoinTransaction.
+"""
+from django.db.models import F
+
+from .models import CoinReward, CoinTransaction, PlatformCoin
+
+APPOINTMENT_FEE = 5
+APPOINTMENT_VET_REWARD = 2
+APPOINTMENT_PLATFORM_SHARE = APPOINTMENT_FEE - APPOINTMENT_VET_REWARD
+
+# New accounts start with a bonus paid out of the platform account
+SIGNUP_BONUS_VET = 200
+SIGNUP_BONUS_FARMER = 100
+
+
+def signup_bonus(is_farmer, is_vet):
+    return SIGNUP_BONUS_VET if is_vet else SIGNUP_BONUS_FARMER if is_farmer else 0
+
+
+def debit_user(user, amount):
+    updated = CoinReward.objects.filter(user=user, coins__gte=amount).update(coins=F('coins') - amount)
+    if not updated:
+        raise ValueError("Insufficient coins to withdraw.")
+
+
+def credit_user(user, amount):
+    max_balance = CoinReward.max_balance_for(user)
+    updated = CoinReward.objects.filter(user=user, coins__lte=max_balance - amount).update(coins=F('coins') + amount)
+    if updated:
+        return
+    if CoinReward.objects.filter(user=user).exists() or amount > max_balance:
+        raise ValueError(f"Exceeds max balance for {CoinReward.role_of(user)}.")
+    CoinReward.objects.create(user=user, coins=amount)
+
+
+def credit_platform(amount):
+    # Lands on a random PlatformCoin shard rather than the single account row
+    PlatformCoin.credit(amount)
+
+
+def charge_appointment(farmer, vet, appointment):
+    """
+    Move the booking fee from the farmer to the vet and the platform.
+
+    Must run inside transaction.atomic() together with the appointment
+    insert: any failure (e.g. insufficient coins) rolls back all of it.
+    """
+    debit_user(farmer, APPOINTMENT_FEE)
+    credit_user(vet, APPOINTMENT_VET_REWARD)
+    credit_platform(APPOINTMENT_PLATFORM_SHARE)
+
+    CoinTransaction.objects.bulk_create([
+        CoinTransaction(user=farmer, amount=-APPOINTMENT_FEE, kind='appointment_fee', appointment=appointment),
+        CoinTransaction(user=vet, amount=APPOINTMENT_VET_REWARD, kind='appointment_reward', appointment=appointment),
+        CoinTransaction(user=None, amount=APPOINTMENT_PLATFORM_SHARE, kind='platform_fee', appointment=appointment),
+    ])
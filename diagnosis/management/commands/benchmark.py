@@ -0,0 +1,246 @@
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import django
+import numpy as np
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from diagnosis.ml import ModelNotAvailable, model_registry
+from diagnosis.models import Appointment, Notification, User
+from diagnosis.seeding import SEED_PASSWORD, seed_database, user_ids
+
+# Users, appointments and notifications the requests pick from
+SAMPLE_SIZE = 1000
+
+
+class Sample:
+    """Random existing rows for the requests to refer to."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.farmers = self.usernames(user_ids('farmer'))
+        self.vets = self.usernames(user_ids('vet'))
+        self.appointments = list(
+            Appointment.objects.order_by('-id').values_list('id', 'vet__username')[:SAMPLE_SIZE]
+        )
+        self.notification_ids = list(Notification.objects.order_by('-id').values_list('id', flat=True)[:SAMPLE_SIZE])
+        try:
+            self.symptoms = model_registry.get().feature_columns
+        except ModelNotAvailable:
+            self.symptoms = None
+        self._signups = 0
+        self._lock = threading.Lock()
+
+    def usernames(self, ids):
+        if not len(ids):
+            return []
+        picked = {int(ids[self.rng.randrange(len(ids))]) for _ in range(SAMPLE_SIZE)}
+        return list(User.objects.filter(id__in=picked).order_by('id').values_list('username', flat=True))
+
+    def farmer(self):
+        return self.rng.choice(self.farmers)
+
+    def vet(self):
+        return self.rng.choice(self.vets)
+
+    def symptom_list(self):
+        return self.rng.sample(self.symptoms, self.rng.randint(1, 5))
+
+    def new_username(self):
+        with self._lock:
+            self._signups += 1
+            return f'bench-{int(time.time())}-{self._signups}'
+
+
+def as_json(method, path, body):
+    return method, path, {'data': json.dumps(body), 'content_type': 'application/json'}
+
+
+def signup_request(s):
+    username = s.new_username()
+    return as_json('post', '/signup/', {
+        'username': username, 'email': f'{username}@example.com', 'password': SEED_PASSWORD, 'is_farmer': True,
+    })
+
+
+def appointment_update_request(s):
+    appointment_id, vet_username = s.rng.choice(s.appointments)
+    return as_json('patch', '/appointments/', {
+        'appointment_id': appointment_id, 'username': vet_username, 'status': 'approved', 'vet_note': 'Benchmark update',
+    })
+
+
+# name -> (requires, build(sample) returning (method, path, client kwargs))
+ENDPOINTS = {
+    'signup': ('farmers', signup_request),
+    'vet-login': ('vets', lambda s: as_json('post', '/vet-login/', {'username': s.vet(), 'password': SEED_PASSWORD})),
+    'farmer-login': ('farmers', lambda s: as_json('post', '/farmer-login/', {'username': s.farmer(), 'password': SEED_PASSWORD})),
+    'update-profile': ('farmers', lambda s: as_json('patch', '/update-profile/', {
+        'username': s.farmer(), 'location_lat': s.rng.uniform(-4.7, 4.6), 'location_lng': s.rng.uniform(33.9, 41.9),
+    })),
+    'appointments-list': ('farmers', lambda s: ('get', '/appointments/', {'data': {'username': s.farmer()}})),
+    'appointments-create': ('vets', lambda s: as_json('post', '/appointments/', {
+        'farmer_username': s.farmer(), 'vet_username': s.vet(), 'farmer_note': 'Benchmark booking',
+    })),
+    'appointments-update': ('appointments', appointment_update_request),
+    'nearby-vets': ('farmers', lambda s: ('get', '/nearby-vets/', {'data': {'username': s.farmer(), 'radius_km': 50}})),
+    'nearby-vets-k': ('farmers', lambda s: ('get', '/nearby-vets/', {'data': {'username': s.farmer(), 'k': 10}})),
+    'predict-disease': ('symptoms', lambda s: ('post', '/predict-disease/', {'data': {'symptoms[]': s.symptom_list()}})),
+    'predict-disease-batch': ('symptoms', lambda s: as_json('post', '/predict-disease-batch/', {
+        'items': [s.symptom_list() for _ in range(20)],
+    })),
+    'model-info': ('symptoms', lambda s: ('get', '/model-info/', {})),
+    'deposit-coins': ('farmers', lambda s: as_json('post', '/deposit-coins/', {'username': s.farmer(), 'coins': 50})),
+    'withdraw-coins': ('farmers', lambda s: as_json('post', '/withdraw-coins/', {'username': s.farmer(), 'coins': 50})),
+    'get-wallet-balance': ('farmers', lambda s: ('get', '/get-wallet-balance/', {'data': {'username': s.farmer()}})),
+    'get-coin-balance': ('farmers', lambda s: ('get', '/get-coin-balance/', {'data': {'username': s.farmer()}})),
+    'account-summary': ('farmers', lambda s: ('get', '/account-summary/', {'data': {'username': s.farmer()}})),
+    'favorite-vets': ('farmers', lambda s: ('get', '/favorite-vets/', {'data': {'username': s.farmer()}})),
+    'add-favorite': ('vets', lambda s: ('post', '/add-favorite/', {
+        'data': {'username': s.farmer(), 'favorite_username': s.vet()},
+    })),
+    'get-notifications': ('farmers', lambda s: ('get', '/get-notifications/', {'data': {'username': s.farmer()}})),
+    'get-unread-count': ('farmers', lambda s: ('get', '/get-unread-count/', {'data': {'username': s.farmer()}})),
+    'mark-notification-as-read': ('notification_ids', lambda s: as_json('patch', '/mark-notification-as-read/', {
+        'notification_ids': s.rng.sample(s.notification_ids, min(10, len(s.notification_ids))),
+    })),
+    'metrics': (None, lambda s: ('get', '/metrics/', {})),
+}
+
+# Long-lived server-sent event streams don't fit a request/response benchmark
+SKIPPED_ENDPOINTS = {'notification-stream': 'long-lived event stream'}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Seed a local SQLite database and measure throughput and latency of every endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vets', type=int, default=500)
+        parser.add_argument('--farmers', type=int, default=5000)
+        parser.add_argument('--appointments', type=int, default=20000)
+        parser.add_argument('--favorites', type=int, default=10000)
+        parser.add_argument('--notifications', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the generated data and the request mix')
+        parser.add_argument('--requests', type=int, default=200, help='Requests sent to each endpoint')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads sending requests')
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), help='Only benchmark these endpoints')
+        parser.add_argument('--reseed', action='store_true', help='Flush and reseed a database that already has users')
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the JSON report')
+
+    def handle(self, *args, **options):
+        # The benchmark flushes and fills the database, so never point it at a real one
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                'The benchmark only runs against SQLite. Set DB_ENGINE=django.db.backends.sqlite3 '
+                'and DB_NAME to a scratch file.'
+            )
+        if settings.REPLICA_DATABASE_ALIAS:
+            raise CommandError('Unset DB_REPLICA_NAME/DB_REPLICA_HOST: the benchmark seeds a single database.')
+
+        started_at = datetime.now(timezone.utc).isoformat()
+        call_command('migrate', verbosity=0)
+        scale = {key: options[key] for key in ('vets', 'farmers', 'appointments', 'favorites', 'notifications')}
+
+        if options['reseed'] or not User.objects.exists():
+            call_command('flush', interactive=False, verbosity=0)
+            start = time.perf_counter()
+            counts = seed_database(seed=options['seed'], log=lambda m: self.stdout.write(f'Seeded {m}'), **scale)
+            self.stdout.write(f'Seeding took {time.perf_counter() - start:.1f}s')
+        else:
+            self.stdout.write('Reusing the seeded database (pass --reseed to regenerate it)')
+            counts = None
+
+        sample = Sample(options['seed'])
+        results = {}
+        for name in options['endpoints'] or ENDPOINTS:
+            requires, build = ENDPOINTS[name]
+            if requires and not getattr(sample, requires):
+                results[name] = {'skipped': f'no {requires} to use'}
+                continue
+            results[name] = self.run_endpoint(sample, build, options['requests'], options['concurrency'])
+            self.report(name, results[name])
+        for name, reason in SKIPPED_ENDPOINTS.items():
+            results[name] = {'skipped': reason}
+
+        report = {
+            'metadata': {
+                'commit': git_commit(),
+                'started_at': started_at,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'scale': scale,
+                'seeded_rows': counts,
+                'seed': options['seed'],
+                'requests_per_endpoint': options['requests'],
+                'concurrency': options['concurrency'],
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+
+    def run_endpoint(self, sample, build, n_requests, concurrency):
+        local = threading.local()
+        # Built up front so every run sends the same requests in the same order
+        requests = [build(sample) for _ in range(n_requests)]
+
+        def send(request):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            method, path, kwargs = request
+            start = time.perf_counter()
+            try:
+                status = getattr(local.client, method)(path, **kwargs).status_code
+            except Exception:
+                status = 'exception'
+            return time.perf_counter() - start, status
+
+        # The test client always sends Host: testserver
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(send, requests))
+            elapsed = time.perf_counter() - start
+
+        latencies = np.array([seconds for seconds, _ in outcomes]) * 1000
+        statuses = Counter(str(status) for _, status in outcomes)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            'requests': n_requests,
+            'errors': sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500),
+            'statuses': dict(statuses),
+            'throughput_rps': round(n_requests / elapsed, 2),
+            'mean_ms': round(float(latencies.mean()), 3),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:28} {result["throughput_rps"]:9.1f} req/s  p50 {result["p50_ms"]:8.2f} ms  '
+            f'p95 {result["p95_ms"]:8.2f} ms  p99 {result["p99_ms"]:8.2f} ms  errors {result["errors"]}'
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from diagnosis.models import PlatformCoin
+
+
+class Command(BaseCommand):
+    help = 'Rebalance the platform coin account evenly across its shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep compacting every --interval seconds')
+        parser.add_argument('--interval', type=float, default=300.0, help='Seconds between compactions with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                total = PlatformCoin.compact()
+            except PlatformCoin.DoesNotExist:
+                raise CommandError('PlatformCoin account not initialized.')
+            self.stdout.write(self.style.SUCCESS(f'Platform balance compacted: {total} coins'))
+            # Credits only check the shard they land on; this is where the exact total is checked
+            if total > PlatformCoin.MAX_BALANCE:
+                self.stderr.write(self.style.WARNING(
+                    f'Platform balance {total} is over the {PlatformCoin.MAX_BALANCE} coin cap; '
+                    f'credits will be refused until debits bring it down.'
+                ))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from diagnosis.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending notifications from the outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Outbox rows delivered per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages instead of exiting once drained')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep between polls when --loop finds nothing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_delivered = total_failed = 0
+
+        while True:
+            delivered, failed = deliver_pending(batch_size)
+            total_delivered += delivered
+            total_failed += failed
+
+            if delivered or failed:
+                self.stdout.write(f'Delivered {delivered} notification(s), {failed} failed')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Outbox drained: {total_delivered} delivered, {total_failed} failed'
+        ))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from diagnosis.seeding import SEED_PASSWORD, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic vets, farmers, appointments, favorites, notifications and coin balances '
+        'spread around the Kenyan counties'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vets', type=int, default=20000)
+        parser.add_argument('--farmers', type=int, default=1000000)
+        parser.add_argument('--appointments', type=int, default=3000000)
+        parser.add_argument('--favorites', type=int, default=1000000)
+        parser.add_argument('--notifications', type=int, default=5000000)
+        parser.add_argument('--seed', type=int, default=0, help='The same seed and database always give the same rows')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument(
+            '--prefix', default='',
+            help='Prefix for generated usernames, so several runs can add to the same database',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        for key in ('vets', 'farmers', 'appointments', 'favorites', 'notifications'):
+            if options[key] < 0:
+                raise CommandError(f'--{key} cannot be negative.')
+
+        start = time.perf_counter()
+        last = [start]
+
+        def log(message):
+            now = time.perf_counter()
+            rows = int(message.split()[0])
+            rate = rows / (now - last[0]) if now > last[0] else 0
+            self.stdout.write(f'{message} ({rate:,.0f} rows/s)')
+            last[0] = now
+
+        # With DEBUG on, every bulk insert's SQL is kept in the connection's query log
+        with override_settings(DEBUG=False):
+            counts = seed_database(
+                vets=options['vets'],
+                farmers=options['farmers'],
+                appointments=options['appointments'],
+                favorites=options['favorites'],
+                notifications=options['notifications'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+                prefix=options['prefix'],
+                log=log,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(counts.values()):,} rows in {time.perf_counter() - start:.1f}s. '
+            f'Every generated user\'s password is "{SEED_PASSWORD}".'
+        ))
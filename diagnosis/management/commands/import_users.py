@@ -0,0 +1,179 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from diagnosis.ledger import signup_bonus
+from diagnosis.models import CertifiedVet, CoinReward, FarmerProfile, PlatformCoin, User, VeterinarianProfile
+from diagnosis.vet_index import vet_index
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def parse_coordinate(value):
+    if value in (None, ''):
+        return None
+    return float(value)
+
+
+def read_rows(path, fmt):
+    """Yield (line number, dict) per user without loading the whole file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+
+class Command(BaseCommand):
+    help = 'Import vets and farmers from a CSV or JSONL file in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row, or JSONL with one user object per line')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users inserted per transaction')
+        parser.add_argument('--password', help='Initial password for rows without their own (hashed once for all of them)')
+        parser.add_argument('--skip-certification-check', action='store_true',
+                            help='Import vets whose email is not in the CertifiedVet registry')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        # One hash shared by every row that uses the initial password
+        self.shared_password = make_password(options['password']) if options['password'] else None
+        self.check_certification = not options['skip_certification_check']
+
+        rows = read_rows(path, fmt)
+        totals = {'imported': 0, 'skipped': 0, 'vets': 0}
+        start = time.perf_counter()
+
+        while True:
+            chunk = list(islice(rows, options['chunk_size']))
+            if not chunk:
+                break
+            imported, skipped, vets = self.import_chunk(chunk)
+            totals['imported'] += imported
+            totals['skipped'] += skipped
+            totals['vets'] += vets
+
+            elapsed = time.perf_counter() - start
+            done = totals['imported'] + totals['skipped']
+            self.stdout.write(f'{done} rows processed, {totals["imported"]} imported ({done / elapsed:.0f} rows/s)')
+
+        # bulk_create() sends no post_save signals, so refresh the nearest-vet index here
+        if totals['vets']:
+            vet_index.invalidate()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {totals["imported"]} user(s), skipped {totals["skipped"]} '
+            f'in {elapsed:.2f}s ({totals["imported"] / elapsed if elapsed else 0:.0f} users/s)'
+        ))
+
+    def build_user(self, row):
+        password = row.get('password')
+        user = User(
+            username=(row.get('username') or '').strip(),
+            email=(row.get('email') or '').strip(),
+            password=make_password(password) if password else self.shared_password or make_password(None),
+            is_farmer=parse_bool(row.get('is_farmer')),
+            is_vet=parse_bool(row.get('is_vet')),
+            location_lat=parse_coordinate(row.get('location_lat')),
+            location_lng=parse_coordinate(row.get('location_lng')),
+        )
+        user.geohash = user.compute_geohash()
+        return user
+
+    def import_chunk(self, chunk):
+        users, skipped = [], 0
+        seen_usernames, seen_emails = set(), set()
+        for line_number, row in chunk:
+            try:
+                user = self.build_user(row)
+            except (TypeError, ValueError) as e:
+                self.stderr.write(f'Skipping line {line_number}: {e}')
+                skipped += 1
+                continue
+            if not user.username or not user.email:
+                # Never echo the row itself: it may carry a plaintext password
+                self.stderr.write(
+                    f'Skipping line {line_number} ({user.username or "no username"}): missing username or email'
+                )
+                skipped += 1
+                continue
+            if user.username in seen_usernames or user.email in seen_emails:
+                self.stderr.write(f'Skipping line {line_number}: duplicate user {user.username}')
+                skipped += 1
+                continue
+            seen_usernames.add(user.username)
+            seen_emails.add(user.email)
+            users.append(user)
+
+        # Existing accounts and uncertified vets are checked with one query each per chunk
+        taken_usernames = set(User.objects.filter(username__in=seen_usernames).values_list('username', flat=True))
+        taken_emails = set(User.objects.filter(email__in=seen_emails).values_list('email', flat=True))
+        certified = set()
+        if self.check_certification:
+            vet_emails = [u.email for u in users if u.is_vet]
+            certified = set(CertifiedVet.objects.filter(email__in=vet_emails).values_list('email', flat=True))
+
+        accepted = []
+        for user in users:
+            if user.username in taken_usernames or user.email in taken_emails:
+                self.stderr.write(f'Skipping {user.username}: username or email already in use')
+            elif self.check_certification and user.is_vet and user.email not in certified:
+                self.stderr.write(f'Skipping {user.username}: email not in Certified Veterinarians registry')
+            else:
+                accepted.append(user)
+                continue
+            skipped += 1
+
+        if not accepted:
+            return 0, skipped, 0
+
+        bonus_total = sum(signup_bonus(u.is_farmer, u.is_vet) for u in accepted)
+
+        with transaction.atomic():
+            if bonus_total:
+                platform = PlatformCoin.objects.first()
+                if platform is None:
+                    raise CommandError('PlatformCoin account not initialized.')
+                try:
+                    platform.subtract_coins(bonus_total)
+                except ValueError as e:
+                    raise CommandError(f'Cannot pay {bonus_total} bonus coins: {e}')
+
+            User.objects.bulk_create(accepted)
+            if any(u.pk is None for u in accepted):
+                # MySQL doesn't return primary keys from bulk inserts
+                ids = dict(User.objects.filter(username__in=[u.username for u in accepted]).values_list('username', 'id'))
+                for user in accepted:
+                    user.pk = ids[user.username]
+
+            VeterinarianProfile.objects.bulk_create([VeterinarianProfile(user=u) for u in accepted if u.is_vet])
+            FarmerProfile.objects.bulk_create([FarmerProfile(user=u) for u in accepted if u.is_farmer and not u.is_vet])
+            CoinReward.objects.bulk_create([
+                CoinReward(user=u, coins=signup_bonus(u.is_farmer, u.is_vet)) for u in accepted
+            ])
+
+        return len(accepted), skipped, sum(1 for u in accepted if u.is_vet)
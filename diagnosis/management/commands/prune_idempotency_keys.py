@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from diagnosis.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        removed = prune_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Pruned {removed} expired idempotency key(s)'))
@@ -1,45 +1,180 @@
+import json
 import os
-import pickle
+import tempfile
+import time
+from datetime import datetime, timezone
+
 import pandas as pd
 import numpy as np
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score
 from django.conf import settings
 
+from diagnosis.artifact import ForestArtifact, save_artifact
+from diagnosis.model_search import candidate_grid, choose, measure_latency, search, within_budget
+
+# Held-out rows each latency is measured on
+LATENCY_SAMPLE_SIZE = 200
+
+
+def max_depth(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+def write_card(path, card):
+    # Atomic for the same reason as the artifact: readers never see half a file
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(card, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
 class Command(BaseCommand):
-    help = 'Train the Random Forest model and save it as a pickle file'
+    help = (
+        'Pick Random Forest hyperparameters by cross-validation within latency and size budgets, '
+        'save the model as a memory-mappable artifact and write its model card'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--n-estimators', type=int, nargs='+', default=[25, 50, 100, 200])
+        parser.add_argument(
+            '--max-depth', type=max_depth, nargs='+', default=[None, 10, 20],
+            help='Tree depths to try; "none" grows trees until the leaves are pure',
+        )
+        parser.add_argument('--folds', type=int, default=5, help='Cross-validation folds')
+        parser.add_argument('--workers', type=int, help='Search processes (default: one per CPU)')
+        parser.add_argument(
+            '--latency-budget-ms', type=float, default=settings.DISEASE_MODEL_LATENCY_BUDGET_MS,
+            help='Largest acceptable single-row p99 predict latency of the compiled artifact',
+        )
+        parser.add_argument(
+            '--size-budget-mb', type=float, default=settings.DISEASE_MODEL_SIZE_BUDGET_MB,
+            help='Largest acceptable artifact size',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['folds'] < 2:
+            raise CommandError('--folds must be at least 2.')
+        if any(n < 1 for n in options['n_estimators']) or any(d is not None and d < 1 for d in options['max_depth']):
+            raise CommandError('--n-estimators and --max-depth must be at least 1.')
+        seed = options['seed']
+        size_budget_bytes = int(options['size_budget_mb'] * 1024 * 1024)
 
-    def handle(self, *args, **kwargs):
         # Load training data
         data_path = os.path.join(settings.BASE_DIR, 'diagnosis/training.csv')
         df = pd.read_csv(data_path)
-        
+
         # Prepare features and labels
         feature_columns = df.drop(columns=['prognosis']).columns.tolist()
         disease_mapping = {disease: idx for idx, disease in enumerate(df['prognosis'].unique())}
         df['prognosis'] = df['prognosis'].map(disease_mapping)
-        
-        X = df[feature_columns]
+
+        X_raw = df[feature_columns].to_numpy(dtype=np.float64)
         y = df['prognosis']
 
         scaler = StandardScaler()
-        X = scaler.fit_transform(X)
+        X = scaler.fit_transform(X_raw)
+
+        X_train, X_test, raw_train, raw_test, y_train, y_test = train_test_split(
+            X, X_raw, y, test_size=0.2, random_state=seed
+        )
+        sample = raw_test[:LATENCY_SAMPLE_SIZE]
+
+        # Cross-validate every candidate on the training split only; the test split is kept for the model card
+        grid = candidate_grid(options['n_estimators'], options['max_depth'])
+        self.stdout.write(f'Searching {len(grid)} candidates with {options["folds"]}-fold cross-validation')
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            results = search(
+                grid, X_train, y_train.to_numpy(), options['folds'], seed, scratch_dir,
+                scaler, feature_columns, disease_mapping, workers=options['workers'],
+            )
+            # Timed here, one at a time, rather than in the busy pool
+            for result in results:
+                artifact = ForestArtifact(result.pop('artifact_path'), expected_features=feature_columns)
+                result['p50_ms'], result['p99_ms'] = (float(t) for t in measure_latency(artifact.predict, sample))
+                del artifact
+        self.stdout.write(f'Search took {time.perf_counter() - start:.1f}s')
+
+        for result in results:
+            fits = within_budget(result, options['latency_budget_ms'], size_budget_bytes)
+            result['within_budget'] = fits
+            self.stdout.write(
+                f'  n_estimators={result["params"]["n_estimators"]:<4} max_depth={str(result["params"]["max_depth"]):<5} '
+                f'cv {result["cv_accuracy_mean"] * 100:6.2f}% ± {result["cv_accuracy_std"] * 100:.2f}  '
+                f'p99 {result["p99_ms"]:.3f} ms  {result["artifact_bytes"] / 1024 / 1024:6.2f} MB'
+                f'{"" if fits else "  (over budget)"}'
+            )
 
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        best = choose(results, options['latency_budget_ms'], size_budget_bytes)
+        if best is None:
+            fastest = min(results, key=lambda r: r['p99_ms'])
+            raise CommandError(
+                f'No candidate fits within {options["latency_budget_ms"]} ms p99 and {options["size_budget_mb"]} MB; '
+                f'the fastest was {fastest["params"]} at {fastest["p99_ms"]:.3f} ms and '
+                f'{fastest["artifact_bytes"] / 1024 / 1024:.2f} MB.'
+            )
 
         # Train model
-        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+        model = RandomForestClassifier(**best['params'], random_state=seed, n_jobs=-1)
+        start = time.perf_counter()
         model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+
+        # Save trained model (written atomically, so running workers hot-reload it safely)
+        version = save_artifact(settings.DISEASE_MODEL_PATH, model, scaler, feature_columns, disease_mapping)
 
-        # Save trained model
-        model_file = os.path.join(settings.BASE_DIR, 'diagnosis/model.pkl')
-        with open(model_file, 'wb') as f:
-            pickle.dump((model, scaler, feature_columns, disease_mapping), f)
-        
         # Model evaluation
         y_pred = model.predict(X_test)
         accuracy = accuracy_score(y_test, y_pred)
-        self.stdout.write(self.style.SUCCESS(f'Model trained and saved successfully with accuracy: {accuracy * 100:.2f}%'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Model {version} ({best["params"]}) trained and saved successfully with accuracy: {accuracy * 100:.2f}%'
+        ))
+
+        # The compiled forest must agree with sklearn on every held-out row
+        artifact = ForestArtifact(settings.DISEASE_MODEL_PATH, expected_features=feature_columns)
+        if not np.array_equal(artifact.predict(raw_test), y_pred):
+            raise CommandError('Compiled forest predictions differ from sklearn; do not serve this artifact.')
+
+        # Single-row latency: what predict-disease/ pays per request
+        sk_p50, sk_p99 = measure_latency(lambda row: model.predict(scaler.transform(row)), sample)
+        fl_p50, fl_p99 = measure_latency(artifact.predict, sample)
+        self.stdout.write(
+            f'Single-row latency: sklearn p50 {sk_p50:.3f} ms / p99 {sk_p99:.3f} ms, '
+            f'compiled p50 {fl_p50:.3f} ms / p99 {fl_p99:.3f} ms ({sk_p50 / fl_p50:.1f}x faster at p50)'
+        )
+
+        y_test = y_test.to_numpy()
+        diseases = {idx: disease for disease, idx in disease_mapping.items()}
+        per_class = {
+            diseases[idx]: float((y_pred[y_test == idx] == idx).mean())
+            for idx in sorted(set(y_test.tolist()))
+        }
+        write_card(settings.DISEASE_MODEL_CARD_PATH, {
+            'version': version,
+            'trained_at': datetime.now(timezone.utc).isoformat(),
+            'hyperparameters': best['params'],
+            'seed': seed,
+            'training_rows': len(X_train),
+            'test_rows': len(X_test),
+            'features': len(feature_columns),
+            'classes': len(disease_mapping),
+            'metrics': {
+                'cv_folds': options['folds'],
+                'cv_accuracy_mean': best['cv_accuracy_mean'],
+                'cv_accuracy_std': best['cv_accuracy_std'],
+                'test_accuracy': float(accuracy),
+            },
+            'per_class_accuracy': per_class,
+            'fit_seconds': round(fit_seconds, 3),
+            'artifact_bytes': os.path.getsize(settings.DISEASE_MODEL_PATH),
+            'latency_ms': {'p50': round(float(fl_p50), 4), 'p99': round(float(fl_p99), 4)},
+            'budgets': {'latency_p99_ms': options['latency_budget_ms'], 'artifact_bytes': size_budget_bytes},
+            'candidates': results,
+        })
+        self.stdout.write(f'Wrote model card to {settings.DISEASE_MODEL_CARD_PATH}')
@@ -0,0 +1,211 @@
+"""
+Per-route request metrics in the Prometheus text format.
+
+MetricsMiddleware times every request. It counts the queries the request
+ran, and the time they took, through an execute wrapper installed on each
+new database connection. It also records the response size. Each
+histogram's buckets are allocated once per route, so recording a request
+is a few bisects and additions under one lock. The metrics view renders
+everything, plus the worker's cache, index and pool stats, for a
+Prometheus scrape.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+RESPONSE_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+INFERENCE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+UNMATCHED_ROUTE = 'unmatched'
+
+_lock = threading.Lock()
+
+# [query count, seconds in queries] for the request being served, if any
+_request_db = ContextVar('request_db', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Callers hold _lock
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels=''):
+        # ``labels`` is empty or a 'name="value",' prefix for the le label
+        series = f'{{{labels.rstrip(",")}}}' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{series} {self.sum}')
+        lines.append(f'{name}_count{series} {self.count}')
+        return lines
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts, histogram.sum, histogram.count = list(self.counts), self.sum, self.count
+        return histogram
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.response_size = Histogram(RESPONSE_SIZE_BUCKETS)
+        self.db_seconds = 0.0
+        self.statuses = {}
+
+
+_routes = {}
+inference = Histogram(INFERENCE_BUCKETS)
+
+
+def observe_inference(seconds):
+    with _lock:
+        inference.observe(seconds)
+
+
+def _record(route, status, seconds, queries, db_seconds, size):
+    with _lock:
+        metrics = _routes.get(route)
+        if metrics is None:
+            metrics = _routes[route] = RouteMetrics()
+        metrics.latency.observe(seconds)
+        metrics.queries.observe(queries)
+        metrics.db_seconds += db_seconds
+        if size is not None:
+            metrics.response_size.observe(size)
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+
+def _db_execute_wrapper(execute, sql, params, many, context):
+    stats = _request_db.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # connection_created fires again whenever a connection is reopened
+    if _db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_execute_wrapper)
+
+
+connection_created.connect(install_query_timer)
+
+
+def _route_of(request):
+    match = request.resolver_match
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.url_name or match.route
+
+
+def _finish(request, response, start, stats, token):
+    _request_db.reset(token)
+    # Streamed bodies are sent after this returns, so neither their size nor their duration is known here
+    size = None if response.streaming else len(response.content)
+    _record(_route_of(request), response.status_code, time.perf_counter() - start, stats[0], stats[1], size)
+    return response
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            stats = [0, 0.0]
+            token = _request_db.set(stats)
+            return _finish(request, await get_response(request), start, stats, token)
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            stats = [0, 0.0]
+            token = _request_db.set(stats)
+            return _finish(request, get_response(request), start, stats, token)
+    return middleware
+
+
+def _gauges():
+    from .hashing import hashing_pool
+    from .ml import prediction_cache
+    from .pubsub import get_broker
+    from .vet_index import vet_index
+
+    cache_stats = prediction_cache.stats()
+    hashing = hashing_pool.stats()
+    index = vet_index.stats()
+    return [
+        ('prediction_cache_entries', 'gauge', cache_stats['size']),
+        ('prediction_cache_hits_total', 'counter', cache_stats['hits']),
+        ('prediction_cache_misses_total', 'counter', cache_stats['misses']),
+        ('prediction_cache_evictions_total', 'counter', cache_stats['evictions']),
+        ('password_hashing_queued', 'gauge', hashing['queued']),
+        ('password_hashing_running', 'gauge', hashing['running']),
+        ('password_hashing_completed_total', 'counter', hashing['completed']),
+        ('password_hashing_rejected_total', 'counter', hashing['rejected']),
+        ('password_hashing_wait_seconds_total', 'counter', hashing['wait_seconds_total']),
+        ('vet_index_size', 'gauge', index['size']),
+        ('vet_index_age_seconds', 'gauge', index['age_seconds'] if index['age_seconds'] is not None else 'NaN'),
+        ('notification_stream_subscribers', 'gauge', get_broker().subscriber_count()),
+    ]
+
+
+def render():
+    with _lock:
+        # Copy under the lock, format outside it
+        routes = sorted(
+            (route, m.latency.copy(), m.queries.copy(), m.response_size.copy(), m.db_seconds, sorted(m.statuses.items()))
+            for route, m in _routes.items()
+        )
+        inference_copy = inference.copy()
+
+    lines = []
+    # Every sample of a metric family has to follow its TYPE line without interruption
+    for index, (name, kind) in enumerate([
+        ('request_duration_seconds', 'histogram'),
+        ('request_db_queries', 'histogram'),
+        ('response_size_bytes', 'histogram'),
+    ], start=1):
+        lines.append(f'# TYPE vetmashinani_{name} {kind}')
+        for route in routes:
+            lines += route[index].render(f'vetmashinani_{name}', f'route="{route[0]}",')
+
+    lines.append('# TYPE vetmashinani_request_db_seconds_total counter')
+    for route in routes:
+        lines.append(f'vetmashinani_request_db_seconds_total{{route="{route[0]}"}} {route[4]}')
+
+    lines.append('# TYPE vetmashinani_responses_total counter')
+    for route in routes:
+        for status, count in route[5]:
+            lines.append(f'vetmashinani_responses_total{{route="{route[0]}",status="{status}"}} {count}')
+
+    lines.append('# TYPE vetmashinani_model_inference_seconds histogram')
+    lines += inference_copy.render('vetmashinani_model_inference_seconds')
+
+    for name, kind, value in _gauges():
+        lines.append(f'# TYPE vetmashinani_{name} {kind}')
+        lines.append(f'vetmashinani_{name} {value}')
+
+    return '\n'.join(lines) + '\n'
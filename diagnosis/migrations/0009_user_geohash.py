@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+from diagnosis.geo import geohash_encode
+
+
+def backfill_geohash(apps, schema_editor):
+    User = apps.get_model('diagnosis', 'User')
+
+    users = User.objects.filter(location_lat__isnull=False, location_lng__isnull=False).only(
+        'id', 'location_lat', 'location_lng'
+    )
+    batch = []
+    for user in users.iterator(chunk_size=2000):
+        user.geohash = geohash_encode(user.location_lat, user.location_lng)
+        batch.append(user)
+        if len(batch) >= 2000:
+            User.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0008_auto_20250415_1434'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
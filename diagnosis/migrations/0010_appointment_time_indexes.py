@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0009_user_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['farmer', 'time_sent'], name='appointment_farmer_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['vet', 'time_sent'], name='appointment_vet_time_idx'),
+        ),
+    ]
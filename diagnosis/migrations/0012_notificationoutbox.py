@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0011_notification_inbox_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('message', models.TextField()),
+                ('channel', models.CharField(choices=[('in_app', 'In-app')], default='in_app', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_messages', to='diagnosis.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['delivered_at', 'id'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
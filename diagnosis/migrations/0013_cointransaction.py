@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0012_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinTransaction',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('amount', models.IntegerField()),
+                ('kind', models.CharField(choices=[('appointment_fee', 'Appointment fee'), ('appointment_reward', 'Appointment reward'), ('platform_fee', 'Platform fee')], max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coin_transactions', to='diagnosis.appointment')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='coin_transactions', to='diagnosis.user')),
+            ],
+        ),
+    ]
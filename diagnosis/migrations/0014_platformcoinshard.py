@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diagnosis', '0013_cointransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformCoinShard',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('slot', models.PositiveSmallIntegerField(unique=True)),
+                ('coins', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
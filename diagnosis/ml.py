@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .artifact import ArtifactError, ForestArtifact, read_header
+from .metrics import observe_inference
+
+
+class ModelNotAvailable(Exception):
+    pass
+
+
+class LoadedModel:
+    """A trained disease model together with the lookups needed to serve it."""
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.feature_columns = artifact.feature_columns
+        self.disease_mapping = artifact.disease_mapping
+        self.version = artifact.version
+        self.path = artifact.path
+        self.loaded_at = timezone.now()
+
+        # Precomputed once so requests don't rebuild them
+        self.feature_index = {name: idx for idx, name in enumerate(self.feature_columns)}
+        self.index_to_disease = {v: k for k, v in self.disease_mapping.items()}
+
+    def symptom_mask(self, symptoms):
+        # Canonical cache key: order, duplicates and unknown symptoms don't matter
+        mask = 0
+        for symptom in symptoms:
+            idx = self.feature_index.get(symptom)
+            if idx is not None:
+                mask |= 1 << idx
+        return mask
+
+    def encode_many(self, symptom_lists):
+        # Unknown symptoms are ignored, as the endpoint always did
+        matrix = np.zeros((len(symptom_lists), len(self.feature_columns)))
+        for row, symptoms in enumerate(symptom_lists):
+            for symptom in symptoms:
+                idx = self.feature_index.get(symptom)
+                if idx is not None:
+                    matrix[row, idx] = 1
+        return matrix
+
+    def predict_proba_many(self, symptom_lists):
+        masks = [self.symptom_mask(symptoms) for symptoms in symptom_lists]
+        proba = np.empty((len(symptom_lists), len(self.artifact.classes)))
+
+        missing = []
+        for row, mask in enumerate(masks):
+            cached = prediction_cache.get(self.version, mask)
+            if cached is None:
+                missing.append(row)
+            else:
+                proba[row] = cached
+
+        # One forest evaluation for every uncached row instead of one per item
+        if missing:
+            start = time.perf_counter()
+            computed = self.artifact.predict_proba(self.encode_many([symptom_lists[row] for row in missing]))
+            observe_inference(time.perf_counter() - start)
+            for row, row_proba in zip(missing, computed):
+                proba[row] = row_proba
+                prediction_cache.put(self.version, masks[row], row_proba.copy())
+
+        return proba
+
+    def predict(self, symptoms, top_k=0):
+        return self.predict_many([symptoms], top_k)[0]
+
+    def predict_many(self, symptom_lists, top_k=0):
+        if not symptom_lists:
+            return []
+
+        classes = self.artifact.classes
+        results = []
+        for row_proba in self.predict_proba_many(symptom_lists):
+            result = {"predicted_disease": self.index_to_disease[classes[np.argmax(row_proba)]]}
+            if top_k:
+                ranked = np.argsort(-row_proba, kind='stable')[:top_k]
+                result["top_predictions"] = [
+                    {"disease": self.index_to_disease[classes[i]], "probability": round(float(row_proba[i]), 4)}
+                    for i in ranked
+                ]
+            results.append(result)
+        return results
+
+    def info(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'path': self.path,
+            'n_features': len(self.feature_columns),
+            'n_diseases': len(self.disease_mapping),
+            'n_trees': self.artifact.n_trees,
+            'prediction_cache': prediction_cache.stats(),
+        }
+
+
+class PredictionCache:
+    """
+    LRU cache of class probabilities keyed by symptom bitmask.
+
+    Entries belong to one model version; the cache empties itself the first
+    time it sees a different version.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def max_size(self):
+        if self._max_size is None:
+            return settings.PREDICTION_CACHE_SIZE
+        return self._max_size
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        with self._lock:
+            self._check_version(version)
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, version, key, value):
+        max_size = self.max_size
+        if max_size <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the trained model.
+
+    The artifact is memory-mapped once and shared by every request in the
+    worker. Each lookup only stats the file; when it changes the header is
+    re-read and the artifact swapped in only if its version actually differs.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._current = None
+        self._signature = None
+
+    @property
+    def path(self):
+        return self._path or settings.DISEASE_MODEL_PATH
+
+    def get(self):
+        path = self.path
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Keep serving what we have if the file is being replaced
+            if self._current is not None:
+                return self._current
+            raise ModelNotAvailable("Model file not found")
+
+        signature = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            self._reload(path, signature)
+        return self._current
+
+    def _reload(self, path, signature):
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            if signature == self._signature:
+                return
+
+            try:
+                version = read_header(path)['version']
+                if self._current is None or self._current.version != version:
+                    self._current = LoadedModel(ForestArtifact(path))
+            except FileNotFoundError:
+                if self._current is None:
+                    raise ModelNotAvailable("Model file not found")
+            except ArtifactError as e:
+                # A bad artifact never replaces one that is already serving
+                if self._current is None:
+                    raise ModelNotAvailable(f"Invalid model artifact: {e}")
+            self._signature = signature
+
+    def info(self):
+        return self.get().info()
+
+
+prediction_cache = PredictionCache()
+model_registry = ModelRegistry()
@@ -0,0 +1,79 @@
+"""
+Cross-validated hyperparameter search for the disease model.
+
+Each (n_estimators, max_depth) candidate is evaluated in its own process:
+k-fold cross-validation on the training split, then a fit on the whole
+training split that is exported as a compiled artifact into a scratch
+directory. Latency is measured afterwards in the parent, one candidate at a
+time, so the timings don't compete with the search for CPU. Nothing here
+uses Django, so the worker processes need no settings.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold, cross_val_score
+
+from .artifact import save_artifact
+
+
+def measure_latency(predict, rows):
+    """Time ``predict`` on one row at a time and return (p50, p99) in milliseconds."""
+    timings = []
+    for row in rows:
+        row = row[None, :]
+        start = time.perf_counter()
+        predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def candidate_grid(n_estimators, max_depths):
+    return [{'n_estimators': n, 'max_depth': depth} for n in n_estimators for depth in max_depths]
+
+
+def evaluate_candidate(params, X, y, folds, seed, artifact_path, scaler, feature_columns, disease_mapping):
+    # One process per candidate already, so each forest fits on a single core
+    model = RandomForestClassifier(**params, random_state=seed, n_jobs=1)
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    scores = cross_val_score(model, X, y, cv=cv, n_jobs=1)
+
+    start = time.perf_counter()
+    model.fit(X, y)
+    fit_seconds = time.perf_counter() - start
+    save_artifact(artifact_path, model, scaler, feature_columns, disease_mapping)
+    return {
+        'params': params,
+        'cv_accuracy_mean': float(scores.mean()),
+        'cv_accuracy_std': float(scores.std()),
+        'fit_seconds': fit_seconds,
+        'artifact_path': artifact_path,
+        'artifact_bytes': os.path.getsize(artifact_path),
+    }
+
+
+def search(grid, X, y, folds, seed, scratch_dir, scaler, feature_columns, disease_mapping, workers=None):
+    """Evaluate every candidate in ``grid`` in a process pool; results come back in grid order."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                evaluate_candidate, params, X, y, folds, seed, os.path.join(scratch_dir, f'candidate{i}.bin'),
+                scaler, feature_columns, disease_mapping,
+            )
+            for i, params in enumerate(grid)
+        ]
+        return [future.result() for future in futures]
+
+
+def within_budget(result, latency_budget_ms, size_budget_bytes):
+    return result['p99_ms'] <= latency_budget_ms and result['artifact_bytes'] <= size_budget_bytes
+
+
+def choose(results, latency_budget_ms, size_budget_bytes):
+    """The most accurate candidate within both budgets, preferring faster then smaller ones on ties."""
+    eligible = [r for r in results if within_budget(r, latency_budget_ms, size_budget_bytes)]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (-r['cv_accuracy_mean'], r['p99_ms'], r['artifact_bytes']))
@@ -1,4 +1,10 @@
-from django.db import models
+import random
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Sum
+
+from .geo import geohash_encode
 
 class CertifiedVet(models.Model):
     id = models.AutoField(primary_key=True)
@@ -16,11 +22,38 @@ class User(models.Model):
     password = models.CharField(max_length=128)
     location_lat = models.FloatField(null=True, blank=True)
     location_lng = models.FloatField(null=True, blank=True)
+    # Derived from location_lat/location_lng on save, indexed for proximity lookups
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True)
     wallet_balance = models.FloatField(default=0.0)
 
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_location()
+        return instance
+
+    def remember_location(self):
+        self._saved_location = (self.__dict__.get('location_lat'), self.__dict__.get('location_lng'))
+
+    def location_changed(self):
+        return getattr(self, '_saved_location', None) != (self.location_lat, self.location_lng)
+
+    def save(self, *args, **kwargs):
+        self.geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'location_lat', 'location_lng'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+    def compute_geohash(self):
+        # bulk_create() skips save(), so bulk writers call this themselves
+        if self.location_lat is None or self.location_lng is None:
+            return ''
+        return geohash_encode(float(self.location_lat), float(self.location_lng))
+
 class VeterinarianProfile(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='vet_profile')
@@ -53,6 +86,13 @@ class Appointment(models.Model):
     vet_note = models.TextField(blank=True, null=True)
     time_sent = models.DateTimeField(auto_now_add=True)  # New field to record time when the appointment is created
 
+    class Meta:
+        # Inbox listings page through one user's appointments newest first
+        indexes = [
+            models.Index(fields=['farmer', 'time_sent'], name='appointment_farmer_time_idx'),
+            models.Index(fields=['vet', 'time_sent'], name='appointment_vet_time_idx'),
+        ]
+
     def __str__(self):
         return f"Appointment between {self.farmer} and {self.vet} sent on {self.time_sent}"
 
@@ -63,9 +103,39 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        # Serves inbox pages, the unread_only filter and badge counts
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_inbox_idx'),
+        ]
+
     def __str__(self):
         return f"Notification to {self.recipient.username} - {self.message[:30]}"
 
+class NotificationOutbox(models.Model):
+    CHANNEL_CHOICES = [
+        ('in_app', 'In-app'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='outbox_messages')
+    message = models.TextField()
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES, default='in_app')
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        # The delivery worker scans undelivered rows in id order
+        indexes = [
+            models.Index(fields=['delivered_at', 'id'], name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        state = 'delivered' if self.delivered_at else 'pending'
+        return f"Outbox ({self.channel}, {state}) to {self.recipient.username} - {self.message[:30]}"
+
 class Favorite(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorites')
@@ -91,9 +161,17 @@ class CoinReward(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.coins} Coins"
 
+    @classmethod
+    def role_of(cls, user):
+        return 'farmer' if user.is_farmer else 'vet' if user.is_vet else None
+
+    @classmethod
+    def max_balance_for(cls, user):
+        return cls.MAX_BALANCES.get(cls.role_of(user), 0)
+
     def add_coins(self, amount):
-        role = 'farmer' if self.user.is_farmer else 'vet' if self.user.is_vet else None
-        max_balance = self.MAX_BALANCES.get(role, 0)
+        role = self.role_of(self.user)
+        max_balance = self.max_balance_for(self.user)
         if self.coins + amount > max_balance:
             raise ValueError(f"Exceeds max balance for {role}.")
         self.coins += amount
@@ -107,25 +185,175 @@ class CoinReward(models.Model):
             raise ValueError("Insufficient coins to withdraw.")
 
 class PlatformCoin(models.Model):
+    """
+    The platform's coin account.
+
+    Credits land on one of PLATFORM_COIN_SHARDS PlatformCoinShard rows
+    chosen at random, and debits are taken from a shard when one can cover
+    them, so concurrent signups and bookings don't all queue on this row's
+    lock. The balance is this row's coins plus every shard; `manage.py
+    compact_platform_coins` periodically rebalances them.
+    """
     COIN_TO_KSH = 25  # The conversion rate from coins to Ksh
     MAX_BALANCE = 10000000
+    ACCOUNT_ID = 1
 
     id = models.AutoField(primary_key=True)
     coins = models.IntegerField(default=0)
 
     def __str__(self):
-        balance_in_ksh = self.coins / self.COIN_TO_KSH  # Corrected division instead of multiplication
-        return f"Vet Mashinani Platform - {self.coins} Coins (Ksh {balance_in_ksh})"
+        total = self.total_coins()
+        balance_in_ksh = total / self.COIN_TO_KSH  # Corrected division instead of multiplication
+        return f"Vet Mashinani Platform - {total} Coins (Ksh {balance_in_ksh})"
 
-    def add_coins(self, amount):
-        if self.coins + amount > self.MAX_BALANCE:
+    @classmethod
+    def total_coins(cls):
+        base = cls.objects.aggregate(total=Sum('coins'))['total'] or 0
+        return base + PlatformCoinShard.total_coins()
+
+    @classmethod
+    def shard_cap(cls):
+        return cls.MAX_BALANCE // settings.PLATFORM_COIN_SHARDS
+
+    @classmethod
+    def credit(cls, amount):
+        # Each shard may hold its share of MAX_BALANCE, so the cap costs no aggregate query
+        # here; compact_platform_coins reports the exact total against it
+        if not PlatformCoinShard.add(amount, cap=cls.shard_cap()):
             raise ValueError("Platform coin limit exceeded.")
-        self.coins += amount
-        self.save()
+
+    @classmethod
+    def debit(cls, amount, account_id=ACCOUNT_ID):
+        if PlatformCoinShard.take(amount):
+            return
+        if cls.objects.filter(pk=account_id, coins__gte=amount).update(coins=F('coins') - amount):
+            return
+
+        # No single row can cover it: lock the account and every shard, then drain them in turn
+        with transaction.atomic():
+            base = cls.objects.select_for_update().get(pk=account_id)
+            shards = list(PlatformCoinShard.objects.select_for_update().order_by('slot'))
+            if base.coins + sum(shard.coins for shard in shards) < amount:
+                raise ValueError("Insufficient platform coin balance.")
+
+            remaining = amount
+            for row in [base] + shards:
+                taken = min(row.coins, remaining)
+                row.coins -= taken
+                remaining -= taken
+            base.save(update_fields=['coins'])
+            PlatformCoinShard.objects.bulk_update(shards, ['coins'])
+
+    @classmethod
+    def compact(cls, account_id=ACCOUNT_ID):
+        """Spread the whole balance evenly over the configured shards; return the total."""
+        with transaction.atomic():
+            base = cls.objects.select_for_update().get(pk=account_id)
+            PlatformCoinShard.ensure_slots()
+            shards = list(PlatformCoinShard.objects.select_for_update().order_by('slot'))
+            total = base.coins + sum(shard.coins for shard in shards)
+
+            n_shards = settings.PLATFORM_COIN_SHARDS
+            per_shard, remainder = divmod(total, n_shards)
+            for shard in shards:
+                # Shards beyond the configured count (after lowering it) are emptied
+                shard.coins = per_shard if shard.slot < n_shards else 0
+            base.coins = remainder
+            base.save(update_fields=['coins'])
+            PlatformCoinShard.objects.bulk_update(shards, ['coins'])
+        return total
+
+    def add_coins(self, amount):
+        self.credit(amount)
 
     def subtract_coins(self, amount):
-        if self.coins >= amount:
-            self.coins -= amount
-            self.save()
-        else:
-            raise ValueError("Insufficient platform coin balance.")
+        self.debit(amount, account_id=self.pk)
+
+class PlatformCoinShard(models.Model):
+    id = models.AutoField(primary_key=True)
+    slot = models.PositiveSmallIntegerField(unique=True)
+    coins = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Platform coin shard {self.slot} - {self.coins} Coins"
+
+    @classmethod
+    def total_coins(cls):
+        return cls.objects.aggregate(total=Sum('coins'))['total'] or 0
+
+    @classmethod
+    def ensure_slots(cls):
+        cls.objects.bulk_create(
+            [cls(slot=slot) for slot in range(settings.PLATFORM_COIN_SHARDS)], ignore_conflicts=True
+        )
+
+    @classmethod
+    def add(cls, amount, cap=None, attempts=3):
+        """Credit ``amount`` to a random shard that stays within ``cap``; False if none did."""
+        slots = random.sample(range(settings.PLATFORM_COIN_SHARDS), min(attempts, settings.PLATFORM_COIN_SHARDS))
+        for slot in slots:
+            rows = cls.objects.filter(slot=slot)
+            if cap is not None:
+                rows = rows.filter(coins__lte=cap - amount)
+            if rows.update(coins=F('coins') + amount):
+                return True
+            if not cls.objects.filter(slot=slot).exists():
+                # First credit since the shard count was raised
+                cls.ensure_slots()
+                if rows.update(coins=F('coins') + amount):
+                    return True
+        return False
+
+    @classmethod
+    def take(cls, amount, attempts=3):
+        """Debit ``amount`` from a random shard able to cover it; False if none could."""
+        slots = list(cls.objects.filter(coins__gte=amount).values_list('slot', flat=True))
+        random.shuffle(slots)
+        for slot in slots[:attempts]:
+            # Another request may have drained the shard since we looked
+            if cls.objects.filter(slot=slot, coins__gte=amount).update(coins=F('coins') - amount):
+                return True
+        return False
+
+class CoinTransaction(models.Model):
+    """Append-only record of every coin movement; a null user is the platform account."""
+    KIND_CHOICES = [
+        ('appointment_fee', 'Appointment fee'),
+        ('appointment_reward', 'Appointment reward'),
+        ('platform_fee', 'Platform fee'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name='coin_transactions')
+    amount = models.IntegerField()  # Positive for credits, negative for debits
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='coin_transactions')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        account = self.user.username if self.user_id else 'platform'
+        return f"{account} {self.amount:+d} coins ({self.kind})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Coin transactions are append-only.")
+        super().save(*args, **kwargs)
+
+class IdempotencyKey(models.Model):
+    """Stored response for a client-supplied Idempotency-Key; pruned after IDEMPOTENCY_KEY_TTL."""
+    id = models.AutoField(primary_key=True)
+    scope = models.CharField(max_length=100)  # The view the key was used with
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # Null while the first request runs
+    content_type = models.CharField(max_length=100, blank=True)
+    response_body = models.BinaryField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}: {self.key} ({self.status_code or 'in progress'})"
@@ -0,0 +1,98 @@
+"""
+Transactional outbox for user notifications.
+
+Views record notification intents with enqueue_notifications() inside the
+same transaction as the change they describe, so an intent exists exactly
+when its change was committed. `manage.py deliver_notifications` drains
+the outbox in batches and hands each channel's messages to its handler,
+keeping delivery (and any slow SMS/push channel) off the request path.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification, NotificationOutbox
+from .pubsub import get_broker, user_channel
+
+MAX_DELIVERY_ATTEMPTS = 5
+
+
+def enqueue_notifications(intents, channel='in_app'):
+    """Write (recipient, message) pairs to the outbox with one INSERT."""
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(recipient=recipient, message=message, channel=channel)
+        for recipient, message in intents
+    ])
+
+
+def deliver_in_app(messages):
+    Notification.objects.bulk_create([
+        Notification(recipient_id=m.recipient_id, message=m.message)
+        for m in messages
+    ])
+    publish_notifications({m.recipient_id for m in messages})
+
+
+def publish_notifications(recipient_ids):
+    # Wake open notification streams once the rows are visible to them
+    def publish():
+        broker = get_broker()
+        for recipient_id in recipient_ids:
+            broker.publish(user_channel(recipient_id))
+
+    transaction.on_commit(publish)
+
+
+# channel -> callable taking a list of NotificationOutbox rows
+CHANNEL_HANDLERS = {
+    'in_app': deliver_in_app,
+}
+
+
+def deliver_pending(batch_size=500):
+    """
+    Deliver one batch of pending outbox messages.
+
+    Returns (delivered, failed). Rows are locked with SKIP LOCKED where the
+    database supports it, so several workers can drain concurrently. A
+    channel that raises leaves its messages pending for a later retry, up
+    to MAX_DELIVERY_ATTEMPTS.
+    """
+    with transaction.atomic():
+        pending = NotificationOutbox.objects.filter(
+            delivered_at__isnull=True, attempts__lt=MAX_DELIVERY_ATTEMPTS
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+
+        batch = list(pending[:batch_size])
+        if not batch:
+            return 0, 0
+
+        by_channel = defaultdict(list)
+        for message in batch:
+            by_channel[message.channel].append(message)
+
+        delivered, failed = [], 0
+        for channel, messages in by_channel.items():
+            ids = [m.id for m in messages]
+            try:
+                handler = CHANNEL_HANDLERS.get(channel)
+                if handler is None:
+                    raise ValueError(f"No delivery handler for channel '{channel}'.")
+                with transaction.atomic():
+                    handler(messages)
+                delivered.extend(ids)
+            except Exception as e:
+                NotificationOutbox.objects.filter(id__in=ids).update(
+                    attempts=F('attempts') + 1, last_error=str(e)
+                )
+                failed += len(ids)
+
+        NotificationOutbox.objects.filter(id__in=delivered).update(
+            delivered_at=timezone.now(), attempts=F('attempts') + 1
+        )
+
+    return len(delivered), failed
@@ -0,0 +1,67 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Clients read the cursor for the next page from this response header
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor.")
+
+
+def parse_page_size(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError("limit must be a number.")
+    if not 0 < size <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return size
+
+
+def keyset_page(queryset, time_field, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of ``queryset``, newest first, and the cursor for the next.
+
+    Rows are ordered by (time_field, id) descending and the cursor holds the
+    last row's pair, so every page is an index range scan instead of an
+    OFFSET that re-reads all earlier pages. The next cursor is None on the
+    last page.
+    """
+    queryset = queryset.order_by(f'-{time_field}', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__lt': timestamp}) | Q(**{time_field: timestamp, 'id__lt': pk})
+        )
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, time_field), last.pk)
+
+
+def paginated_response(response, next_cursor):
+    if next_cursor:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    return response
@@ -0,0 +1,50 @@
+"""
+Username -> user lookups for the read views.
+
+resolve_user() answers from a memo on the request, then from the Django
+cache, and only then from the database. Only fields that rarely change are
+cached (id, role flags and location). Balances are always read fresh.
+update_profile/ and signup/ call invalidate_user() when they change these
+fields, and deleting a user invalidates through a signal. Writes that
+bypass them are picked up after USER_RESOLVER_CACHE_TTL seconds.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import User
+
+ResolvedUser = namedtuple('ResolvedUser', ['id', 'username', 'is_farmer', 'is_vet', 'location_lat', 'location_lng'])
+
+
+def user_cache_key(username):
+    return f'user:{username}'
+
+
+def resolve_user(request, username):
+    """Return a ResolvedUser for ``username``, or None if there is no such user."""
+    memo = request.__dict__.setdefault('_resolved_users', {})
+    if username in memo:
+        return memo[username]
+
+    key = user_cache_key(username)
+    user = cache.get(key)
+    if user is None:
+        # Fill from the primary: a lagging replica's row would stay cached for the whole TTL
+        row = User.objects.using(DEFAULT_DB_ALIAS).filter(username=username).values_list(*ResolvedUser._fields).first()
+        if row is None:
+            # Unknown usernames are not cached, so a later signup is found straight away
+            return None
+        user = ResolvedUser(*row)
+        cache.set(key, user, settings.USER_RESOLVER_CACHE_TTL)
+
+    memo[username] = user
+    return user
+
+
+def invalidate_user(username):
+    # Again after commit, so a concurrent reader can't re-cache the old row
+    cache.delete(user_cache_key(username))
+    transaction.on_commit(lambda: cache.delete(user_cache_key(username)))
@@ -0,0 +1,340 @@
+"""
+Synthetic data for benchmarks, load tests and generate_data.
+
+Users are spread across the county centroids in counties.py, weighted by
+population, with vets more concentrated in the populous counties than
+farmers. Activity is skewed: a few farmers book most appointments, most
+bookings go to a vet in the farmer's own county, recent rows outnumber old
+ones, and bookings cluster in working hours.
+
+Each table is generated from its own random.Random seeded from ``seed``,
+so the same arguments always produce the same rows. Rows are streamed into
+the database in batches. Memory grows with the number of users (one id
+and one county index per user) but not with the number of rows generated.
+"""
+import math
+import random
+from datetime import timedelta
+from itertools import accumulate, islice
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .counties import COUNTIES
+from .ledger import signup_bonus
+from .models import Appointment, CoinReward, Favorite, FarmerProfile, Notification, PlatformCoin, User, VeterinarianProfile
+from .vet_index import vet_index
+
+SEED_PASSWORD = 'vetmashinani'
+
+# Roughly the extent of Kenya
+MIN_LAT, MAX_LAT = -4.7, 4.6
+MIN_LNG, MAX_LNG = 33.9, 41.9
+
+HISTORY_DAYS = 365
+
+# Standard deviation, in degrees, of users around their county centroid
+SCATTER_DEGREES = 0.25
+# Exponents on county population: above 1 favours big counties, below 1 evens them out
+VET_URBAN_BIAS = 1.4
+FARMER_URBAN_BIAS = 0.7
+# Higher values put more of the activity on fewer users (1 is uniform)
+FARMER_ACTIVITY_SKEW = 2.0
+VET_POPULARITY_SKEW = 1.5
+RECIPIENT_SKEW = 1.5
+# Chance that a booking or favorite goes to a vet in the farmer's county
+LOCAL_VET_PROBABILITY = 0.85
+# Mean age of appointments and notifications; older rows get exponentially rarer
+MEAN_AGE_DAYS = 60
+# Relative booking volume for each local hour of the day
+HOURLY_WEIGHTS = (1, 1, 1, 1, 1, 2, 4, 8, 12, 14, 14, 13, 11, 12, 13, 12, 10, 8, 6, 5, 4, 3, 2, 1)
+HOUR_CUM_WEIGHTS = list(accumulate(HOURLY_WEIGHTS))
+
+FARMER_NOTES = (
+    'My cattle have stopped eating.',
+    'Two of my goats are coughing and have a fever.',
+    'My cow has swollen udders and the milk has clots.',
+    'The chickens are weak and their droppings are watery.',
+    'My calf has diarrhoea and is not suckling.',
+    'One of the sheep is limping and has sores on its feet.',
+)
+VET_NOTES = (
+    'Visiting tomorrow morning.',
+    'Please isolate the animal until I arrive.',
+    'I will come this afternoon with the vaccine.',
+    'Keep the animals hydrated, I will call you.',
+)
+
+
+def insert_raw(model, objs):
+    """
+    Insert ``objs`` with every value exactly as set on the instances.
+
+    This is how loaddata saves rows: auto_now_add fields keep the historical
+    timestamps generated for them instead of being stamped with the current
+    time, and no field metadata is changed. Primary keys are not set on
+    ``objs``.
+    """
+    connection = connections[router.db_for_write(model)]
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    step = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    for start in range(0, len(objs), step):
+        model._base_manager._insert(objs[start:start + step], fields=fields, raw=True, using=connection.alias)
+
+
+def bulk_insert(model, rows, batch_size, raw=False, **kwargs):
+    """
+    Insert an iterable of unsaved instances ``batch_size`` at a time; returns the count.
+
+    With ``raw`` the rows go through insert_raw() instead of bulk_create().
+    """
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return total
+        with transaction.atomic():
+            if raw:
+                insert_raw(model, batch)
+            else:
+                model.objects.bulk_create(batch, **kwargs)
+        total += len(batch)
+
+
+def table_rng(seed, table):
+    return random.Random(f'{seed}:{table}')
+
+
+def county_cum_weights(role):
+    bias = VET_URBAN_BIAS if role == 'vet' else FARMER_URBAN_BIAS
+    return list(accumulate(c['population'] ** bias for c in COUNTIES))
+
+
+def county_location(rng, county):
+    lat = rng.gauss(county['lat'], SCATTER_DEGREES)
+    lng = rng.gauss(county['lng'], SCATTER_DEGREES)
+    return min(max(lat, MIN_LAT), MAX_LAT), min(max(lng, MIN_LNG), MAX_LNG)
+
+
+def skewed_pick(rng, values, skew):
+    # Low indexes come up far more often than high ones; values are in random order, so nobody is favoured by id
+    return int(values[int(len(values) * rng.random() ** skew)])
+
+
+def iter_users(rng, role, count, password_hash, prefix=''):
+    is_vet = role == 'vet'
+    cum_weights = county_cum_weights(role)
+    counties = range(len(COUNTIES))
+    for i in range(count):
+        county = COUNTIES[rng.choices(counties, cum_weights=cum_weights)[0]]
+        lat, lng = county_location(rng, county)
+        user = User(
+            username=f'{prefix}{role}{i}',
+            email=f'{prefix}{role}{i}@example.com',
+            password=password_hash,
+            is_vet=is_vet,
+            is_farmer=not is_vet,
+            location_lat=round(lat, 6),
+            location_lng=round(lng, 6),
+            # Most wallets hold a few hundred shillings, a few hold tens of thousands
+            wallet_balance=round(min(rng.lognormvariate(6.5, 1.2), 100000), 2),
+        )
+        user.geohash = user.compute_geohash()
+        yield user
+
+
+def role_queryset(role):
+    return User.objects.filter(is_vet=True) if role == 'vet' else User.objects.filter(is_farmer=True, is_vet=False)
+
+
+def user_ids(role):
+    return np.fromiter(role_queryset(role).order_by('id').values_list('id', flat=True).iterator(), dtype=np.int64)
+
+
+class CountyPool:
+    """
+    The ids of every user of a role, grouped by nearest county centroid.
+
+    Locations are read in chunks and only the id and an int8 county index
+    are kept, so a million users take about 17 MB.
+    """
+
+    def __init__(self, role, rng, chunk_size=50000):
+        centroids = np.array([(c['lat'], c['lng']) for c in COUNTIES])
+        count = role_queryset(role).count()
+        ids = np.empty(count, dtype=np.int64)
+        county = np.empty(count, dtype=np.int8)
+        rows = role_queryset(role).order_by('id').values_list('id', 'location_lat', 'location_lng')
+        filled = 0
+        rows = rows.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(rows, chunk_size)):
+            chunk = np.array(chunk, dtype=np.float64).reshape(-1, 3)
+            end = filled + len(chunk)
+            ids[filled:end] = chunk[:, 0]
+            # Users without a location count towards the county nearest (0, 0)
+            points = np.nan_to_num(chunk[:, 1:], nan=0.0)
+            county[filled:end] = ((points[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+            filled = end
+        ids, county = ids[:filled], county[:filled]
+
+        # Shuffle so skewed picks don't always land on the oldest users
+        order = np.random.default_rng(rng.getrandbits(64)).permutation(len(ids))
+        ids, county = ids[order], county[order]
+        by_county = np.argsort(county, kind='stable')
+        self.ids = ids
+        self.county = county
+        self.county_ids = ids[by_county]
+        self.bounds = np.searchsorted(county[by_county], np.arange(len(COUNTIES) + 1))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def pick(self, rng, skew):
+        index = int(len(self.ids) * rng.random() ** skew)
+        return int(self.ids[index]), int(self.county[index])
+
+    def pick_near(self, rng, county, skew):
+        start, end = self.bounds[county], self.bounds[county + 1]
+        if end > start and rng.random() < LOCAL_VET_PROBABILITY:
+            return skewed_pick(rng, self.county_ids[start:end], skew)
+        return skewed_pick(rng, self.ids, skew)
+
+
+def recent_time(rng, now):
+    """A time in the last HISTORY_DAYS, mostly recent and in the local daytime."""
+    age_days = min(rng.expovariate(1 / MEAN_AGE_DAYS), HISTORY_DAYS - 1)
+    day = timezone.localtime(now - timedelta(days=math.floor(age_days)))
+    hour = rng.choices(range(24), cum_weights=HOUR_CUM_WEIGHTS)[0]
+    moment = day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+    if moment > now:
+        moment -= timedelta(days=1)
+    return moment, (now - moment).total_seconds() / 86400
+
+
+def iter_appointments(rng, count, farmers, vets, now):
+    for _ in range(count):
+        farmer_id, county = farmers.pick(rng, FARMER_ACTIVITY_SKEW)
+        time_sent, age_days = recent_time(rng, now)
+        # Vets get through new requests within a couple of days
+        weights = (6, 3, 1) if age_days < 2 else (1, 8, 2)
+        status = rng.choices(('pending', 'approved', 'cancelled'), weights=weights)[0]
+        yield Appointment(
+            farmer_id=farmer_id,
+            vet_id=vets.pick_near(rng, county, VET_POPULARITY_SKEW),
+            farmer_note=rng.choice(FARMER_NOTES),
+            status=status,
+            vet_note='' if status == 'pending' else rng.choice(VET_NOTES),
+            time_sent=time_sent,
+        )
+
+
+def iter_favorites(rng, count, farmers, vets):
+    for _ in range(count):
+        farmer_id, county = farmers.pick(rng, FARMER_ACTIVITY_SKEW)
+        yield Favorite(user_id=farmer_id, favorite_user_id=vets.pick_near(rng, county, VET_POPULARITY_SKEW))
+
+
+def coin_balance(rng, is_vet):
+    # Everyone keeps their signup bonus; a few have bought or earned many more coins
+    return signup_bonus(not is_vet, is_vet) + int(min(rng.paretovariate(1.5), 200) * 50) - 50
+
+
+def notification_message(rng):
+    kind = rng.random()
+    if kind < 0.6:
+        status = rng.choices(('approved', 'cancelled'), weights=(4, 1))[0]
+        return f'Your appointment has been updated. Status: {status}'
+    coins = rng.choice((50, 100, 200, 500, 1000))
+    verb, direction = ('deposited', 'from') if kind < 0.85 else ('withdrew', 'to')
+    return f'You {verb} {coins} coins (KES {coins / CoinReward.COIN_TO_KSH:.2f}) {direction} your wallet.'
+
+
+def iter_notifications(rng, count, all_ids, now):
+    for _ in range(count):
+        created_at, age_days = recent_time(rng, now)
+        yield Notification(
+            recipient_id=skewed_pick(rng, all_ids, RECIPIENT_SKEW),
+            message=notification_message(rng),
+            created_at=created_at,
+            # Almost everything older than a week has been read
+            is_read=rng.random() < min(0.3 + age_days / 10, 0.97),
+        )
+
+
+def seed_database(vets, farmers, appointments=0, favorites=0, notifications=0, seed=0, batch_size=5000, prefix='',
+                  log=None):
+    """
+    Add users and their activity to the database.
+
+    Every seeded user's password is SEED_PASSWORD and their usernames start
+    with ``prefix``, so runs with different prefixes can fill the same
+    database. Activity is spread over every vet and farmer in the database,
+    not just the new ones. Returns the number of rows written to each table.
+    """
+    log = log or (lambda message: None)
+    now = timezone.now()
+    counts = {}
+
+    PlatformCoin.objects.get_or_create(id=PlatformCoin.ACCOUNT_ID, defaults={'coins': PlatformCoin.MAX_BALANCE // 2})
+
+    # One hash for every user, as import_users does with --password
+    password_hash = make_password(SEED_PASSWORD)
+    new_ids = {}
+    for role, count in (('vet', vets), ('farmer', farmers)):
+        last_id = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        users = iter_users(table_rng(seed, f'{prefix}{role}'), role, count, password_hash, prefix)
+        counts[f'{role}s'] = bulk_insert(User, users, batch_size)
+        new_ids[role] = np.fromiter(
+            role_queryset(role).filter(id__gt=last_id).order_by('id').values_list('id', flat=True).iterator(),
+            dtype=np.int64,
+        )
+        log(f'{counts[f"{role}s"]} {role}s')
+
+    bulk_insert(VeterinarianProfile, (VeterinarianProfile(user_id=int(i)) for i in new_ids['vet']), batch_size)
+    bulk_insert(FarmerProfile, (FarmerProfile(user_id=int(i)) for i in new_ids['farmer']), batch_size)
+    coins_rng = table_rng(seed, f'{prefix}coins')
+    counts['coin_rewards'] = bulk_insert(CoinReward, (
+        CoinReward(user_id=int(i), coins=coin_balance(coins_rng, is_vet))
+        for ids, is_vet in ((new_ids['vet'], True), (new_ids['farmer'], False)) for i in ids
+    ), batch_size)
+    log(f'{counts["coin_rewards"]} coin balances')
+
+    pool_rng = table_rng(seed, f'{prefix}pools')
+    vet_pool, farmer_pool = CountyPool('vet', pool_rng), CountyPool('farmer', pool_rng)
+
+    if len(vet_pool) and len(farmer_pool):
+        # Raw, so time_sent keeps the generated history rather than the insert time
+        counts['appointments'] = bulk_insert(
+            Appointment,
+            iter_appointments(table_rng(seed, f'{prefix}appointments'), appointments, farmer_pool, vet_pool, now),
+            batch_size, raw=True,
+        )
+        log(f'{counts["appointments"]} appointments')
+
+        # Repeated pairs are dropped by the unique constraint
+        existing = Favorite.objects.count()
+        bulk_insert(
+            Favorite, iter_favorites(table_rng(seed, f'{prefix}favorites'), favorites, farmer_pool, vet_pool),
+            batch_size, ignore_conflicts=True,
+        )
+        counts['favorites'] = Favorite.objects.count() - existing
+        log(f'{counts["favorites"]} favorites')
+
+    # Shuffled together so the skewed recipient pick doesn't favour vets
+    all_ids = np.concatenate([vet_pool.ids, farmer_pool.ids])
+    all_ids = np.random.default_rng(pool_rng.getrandbits(64)).permutation(all_ids)
+    del vet_pool, farmer_pool
+    if len(all_ids):
+        counts['notifications'] = bulk_insert(
+            Notification,
+            iter_notifications(table_rng(seed, f'{prefix}notifications'), notifications, all_ids, now),
+            batch_size, raw=True,
+        )
+        log(f'{counts["notifications"]} notifications')
+
+    # bulk_create() sends no signals, so the nearest-vet index doesn't know about the new vets
+    vet_index.invalidate()
+    return counts
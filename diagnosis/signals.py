@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Notification, User
+from .outbox import publish_notifications
+from .resolver import invalidate_user
+from .vet_index import vet_index
+
+
+@receiver(post_save, sender=User)
+def refresh_vet_index_on_save(sender, instance, created, **kwargs):
+    # Wallet and other non-location saves on vets leave the index alone
+    # After commit, or a rebuild racing the transaction would snapshot the old rows under the new generation
+    if instance.is_vet and (created or instance.location_changed()):
+        transaction.on_commit(vet_index.invalidate)
+    instance.remember_location()
+
+
+@receiver(post_delete, sender=User)
+def refresh_vet_index_on_delete(sender, instance, **kwargs):
+    if instance.is_vet:
+        transaction.on_commit(vet_index.invalidate)
+    # A cached id for a deleted user would point writes at a missing row
+    invalidate_user(instance.username)
+
+
+@receiver(post_save, sender=Notification)
+def publish_new_notification(sender, instance, created, **kwargs):
+    # Outbox delivery uses bulk_create and publishes on its own
+    if created:
+        publish_notifications({instance.recipient_id})
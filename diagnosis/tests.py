@@ -1,3 +1,1088 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from .artifact import ArtifactError, ForestArtifact, save_artifact
+from .db_routers import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, read_only_view
+from .geo import bounding_box, geohash_encode, geohash_search_cells, haversine_km
+from .hashing import HashingPool, HashingPoolBusy, hashing_pool
+from .idempotency import idempotent
+from .ledger import charge_appointment
+from .ml import ModelNotAvailable, ModelRegistry, PredictionCache
+from .model_search import choose
+from .models import (
+    Appointment, CertifiedVet, CoinReward, CoinTransaction, FarmerProfile, IdempotencyKey, Notification, NotificationOutbox, PlatformCoin,
+    PlatformCoinShard, User,
+)
+from .outbox import CHANNEL_HANDLERS, MAX_DELIVERY_ATTEMPTS, deliver_pending, enqueue_notifications
+from .pagination import NEXT_CURSOR_HEADER
+from .pubsub import get_broker, user_channel
+from .seeding import CountyPool, seed_database
+from .vet_index import vet_index
+
+
+class ForestArtifactTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        df = pd.read_csv(os.path.join(settings.BASE_DIR, 'diagnosis/training.csv'))
+        cls.feature_columns = df.drop(columns=['prognosis']).columns.tolist()
+        disease_mapping = {disease: idx for idx, disease in enumerate(df['prognosis'].unique())}
+
+        cls.X_raw = df[cls.feature_columns].to_numpy(dtype=np.float64)
+        y = df['prognosis'].map(disease_mapping)
+
+        cls.scaler = StandardScaler()
+        X = cls.scaler.fit_transform(cls.X_raw)
+        cls.model = RandomForestClassifier(n_estimators=25, random_state=0, n_jobs=1)
+        cls.model.fit(X, y)
+
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, 'model.bin')
+        save_artifact(cls.path, cls.model, cls.scaler, cls.feature_columns, disease_mapping)
+
+        # Training rows plus unseen symptom combinations
+        random_rows = np.random.RandomState(0).randint(0, 2, size=(300, len(cls.feature_columns)))
+        cls.rows = np.vstack([cls.X_raw, random_rows.astype(np.float64)])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def test_matches_sklearn_on_batches(self):
+        artifact = ForestArtifact(self.path)
+        scaled = self.scaler.transform(self.rows)
+
+        np.testing.assert_array_equal(artifact.predict(self.rows), self.model.predict(scaled))
+        np.testing.assert_allclose(artifact.predict_proba(self.rows), self.model.predict_proba(scaled), atol=1e-12)
+
+    def test_matches_sklearn_on_single_rows(self):
+        artifact = ForestArtifact(self.path)
+
+        for row in self.rows[::25]:
+            scaled = self.scaler.transform(row[None, :])
+            np.testing.assert_array_equal(artifact.predict(row[None, :]), self.model.predict(scaled))
+            np.testing.assert_allclose(artifact.predict_proba(row), self.model.predict_proba(scaled), atol=1e-12)
+
+    def test_arrays_are_read_only(self):
+        artifact = ForestArtifact(self.path)
+        self.assertFalse(artifact.threshold.flags.writeable)
+
+    def test_rejects_unexpected_feature_list(self):
+        with self.assertRaises(ArtifactError):
+            ForestArtifact(self.path, expected_features=self.feature_columns[::-1])
+
+    def test_rejects_other_files(self):
+        path = os.path.join(self.tmpdir.name, 'model.pkl')
+        with open(path, 'wb') as f:
+            f.write(b'not a model artifact')
+        with self.assertRaises(ArtifactError):
+            ForestArtifact(path)
+
+
+class ModelSearchTests(SimpleTestCase):
+    def test_choose_prefers_accuracy_then_latency_within_budgets(self):
+        results = [
+            {'params': 'slow', 'cv_accuracy_mean': 1.0, 'p99_ms': 5.0, 'artifact_bytes': 100},
+            {'params': 'large', 'cv_accuracy_mean': 1.0, 'p99_ms': 0.2, 'artifact_bytes': 5000},
+            {'params': 'fast', 'cv_accuracy_mean': 0.99, 'p99_ms': 0.1, 'artifact_bytes': 100},
+            {'params': 'faster', 'cv_accuracy_mean': 0.99, 'p99_ms': 0.05, 'artifact_bytes': 200},
+        ]
+
+        self.assertEqual(choose(results, latency_budget_ms=1.0, size_budget_bytes=1000)['params'], 'faster')
+        self.assertEqual(choose(results, latency_budget_ms=1.0, size_budget_bytes=10000)['params'], 'large')
+        self.assertIsNone(choose(results, latency_budget_ms=0.01, size_budget_bytes=10000))
+
+    def test_train_model_writes_artifact_and_card(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            model_path, card_path = os.path.join(tmpdir, 'model.bin'), os.path.join(tmpdir, 'model.card.json')
+            with override_settings(DISEASE_MODEL_PATH=model_path, DISEASE_MODEL_CARD_PATH=card_path):
+                call_command(
+                    'train_model', n_estimators=[5, 10], max_depth=[None], folds=2, workers=1,
+                    latency_budget_ms=1000, stdout=io.StringIO(),
+                )
+            with open(card_path) as f:
+                card = json.load(f)
+
+            self.assertEqual(card['version'], ForestArtifact(model_path).version)
+            self.assertEqual(card['artifact_bytes'], os.path.getsize(model_path))
+            self.assertEqual(len(card['candidates']), 2)
+            self.assertEqual(len(card['per_class_accuracy']), card['classes'])
+            self.assertLessEqual(card['latency_ms']['p50'], card['latency_ms']['p99'])
+
+
+class GeohashTests(SimpleTestCase):
+    def test_known_vectors(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geohash_encode(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(geohash_encode(-25.382708, -49.265506, 12), '6gkzwgjzn820')
+        self.assertEqual(geohash_encode(-1.2921, 36.8219, 5), 'kzf0t')
+
+    def test_points_inside_the_radius_fall_in_the_search_cells(self):
+        rng = np.random.default_rng(0)
+        checked = 0
+        for _ in range(300):
+            lat, lng = rng.uniform(-60, 60), rng.uniform(-170, 170)
+            radius_km = float(rng.choice([0.5, 5, 25, 100, 300]))
+            cells = geohash_search_cells(lat, lng, radius_km)
+            if cells is None:
+                continue
+            min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+            lats, lngs = rng.uniform(min_lat, max_lat, 300), rng.uniform(min_lng, max_lng, 300)
+            inside = haversine_km(lat, lng, lats, lngs) <= radius_km
+            for point_lat, point_lng in zip(lats[inside], lngs[inside]):
+                self.assertTrue(geohash_encode(point_lat, point_lng).startswith(tuple(cells)), (lat, lng, radius_km))
+                checked += 1
+        self.assertGreater(checked, 10000)
+
+
+def fit_small_model(n_estimators=10, random_state=0):
+    """A quick forest on the bundled training data, for tests that need a real artifact."""
+    df = pd.read_csv(os.path.join(settings.BASE_DIR, 'diagnosis/training.csv'))
+    feature_columns = df.drop(columns=['prognosis']).columns.tolist()
+    disease_mapping = {disease: idx for idx, disease in enumerate(df['prognosis'].unique())}
+    X_raw = df[feature_columns].to_numpy(dtype=np.float64)
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=1)
+    model.fit(X_raw, df['prognosis'].map(disease_mapping))
+    return df, model, feature_columns, disease_mapping
+
+
+class PredictionEndpointTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        df, model, feature_columns, disease_mapping = fit_small_model()
+        cls.n_diseases = len(disease_mapping)
+
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, 'model.bin')
+        cls.version = save_artifact(cls.path, model, None, feature_columns, disease_mapping)
+
+        # One row of each of the first few diseases, as symptom name lists
+        rows = df.drop_duplicates('prognosis').head(5)
+        cls.items = [[name for name in feature_columns if row[name] == 1] for _, row in rows.iterrows()]
+        cls.diseases = rows['prognosis'].tolist()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def post(self, body):
+        with override_settings(DISEASE_MODEL_PATH=self.path):
+            return self.client.post('/predict-disease-batch/', json.dumps(body), content_type='application/json')
+
+    def predict(self, data):
+        with override_settings(DISEASE_MODEL_PATH=self.path):
+            return self.client.post('/predict-disease/', data)
+
+    def test_results_follow_the_order_of_the_items(self):
+        response = self.post({'items': self.items[::-1], 'top_k': 2})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['predicted_disease'] for r in results], self.diseases[::-1])
+        self.assertTrue(all(len(r['top_predictions']) == 2 for r in results))
+
+    def test_rejects_items_that_are_not_lists_of_names(self):
+        for items in ([[1, {'a': 1}]], [['fever', None]], ['fever'], 'fever'):
+            self.assertEqual(self.post({'items': items}).status_code, 400, items)
+
+    def test_predict_disease_defaults_to_three_ranked_predictions(self):
+        response = self.predict({'symptoms[]': self.items[0]})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['predicted_disease'], self.diseases[0])
+        self.assertEqual(body['model_version'], self.version)
+        self.assertEqual(len(body['top_predictions']), 3)
+        self.assertEqual(body['top_predictions'][0]['disease'], self.diseases[0])
+        probabilities = [p['probability'] for p in body['top_predictions']]
+        self.assertEqual(probabilities, sorted(probabilities, reverse=True))
+
+    def test_predict_disease_honours_top_k(self):
+        response = self.predict({'symptoms[]': self.items[1], 'top_k': '5'})
+        self.assertEqual(len(response.json()['top_predictions']), 5)
+
+        # top_k=0 asks for the bare prediction, as before ranked results existed
+        body = self.predict({'symptoms[]': self.items[1], 'top_k': '0'}).json()
+        self.assertEqual(body['predicted_disease'], self.diseases[1])
+        self.assertNotIn('top_predictions', body)
+
+    def test_predict_disease_rejects_a_bad_top_k(self):
+        for top_k in ('three', '-1', str(self.n_diseases + 1)):
+            response = self.predict({'symptoms[]': self.items[0], 'top_k': top_k})
+            self.assertEqual(response.status_code, 400, top_k)
+            self.assertIn('top_k', response.json()['error'])
+
+    def test_model_info_describes_the_serving_model(self):
+        with override_settings(DISEASE_MODEL_PATH=self.path):
+            response = self.client.get('/model-info/')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['version'], self.version)
+        self.assertEqual(body['path'], self.path)
+        self.assertEqual(body['n_trees'], 10)
+        self.assertEqual(body['n_diseases'], self.n_diseases)
+        self.assertIn('hits', body['prediction_cache'])
+
+    def test_endpoints_without_a_model(self):
+        registry = ModelRegistry(path=os.path.join(self.tmpdir.name, 'missing.bin'))
+        with mock.patch('diagnosis.views.model_registry', registry):
+            self.assertEqual(self.client.get('/model-info/').status_code, 503)
+            self.assertEqual(self.client.post('/predict-disease/', {'symptoms[]': ['itching']}).status_code, 500)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.artifacts = {}
+        for name, random_state in (('a', 0), ('b', 1)):
+            _, model, feature_columns, disease_mapping = fit_small_model(n_estimators=5, random_state=random_state)
+            path = os.path.join(cls.tmpdir.name, f'{name}.bin')
+            cls.artifacts[name] = (path, save_artifact(path, model, None, feature_columns, disease_mapping))
+
+        # Same forest, but a feature list the loader must refuse
+        feature_columns = list(feature_columns)
+        feature_columns[1] = feature_columns[0]
+        cls.duplicate_features = os.path.join(cls.tmpdir.name, 'duplicates.bin')
+        save_artifact(cls.duplicate_features, model, None, feature_columns, disease_mapping)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.path = os.path.join(self.tmpdir.name, f'{self._testMethodName}.bin')
+        self.registry = ModelRegistry(path=self.path)
+
+    def install(self, source):
+        # Replaced the way train_model does it: a new file renamed over the old one
+        shutil.copyfile(source, f'{self.path}.tmp')
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def install_bytes(self, data):
+        with open(f'{self.path}.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def test_replacing_the_file_reloads_the_model(self):
+        self.install(self.artifacts['a'][0])
+        self.assertEqual(self.registry.get().version, self.artifacts['a'][1])
+
+        self.install(self.artifacts['b'][0])
+        self.assertEqual(self.registry.get().version, self.artifacts['b'][1])
+
+    def test_unchanged_file_is_not_reloaded(self):
+        self.install(self.artifacts['a'][0])
+        loaded = self.registry.get()
+
+        with mock.patch('diagnosis.ml.read_header') as read_header:
+            self.assertIs(self.registry.get(), loaded)
+        read_header.assert_not_called()
+
+    def test_same_version_keeps_the_loaded_model(self):
+        self.install(self.artifacts['a'][0])
+        loaded = self.registry.get()
+
+        # A new inode, so the header is read again, but the version matches
+        self.install(self.artifacts['a'][0])
+        with mock.patch('diagnosis.ml.ForestArtifact') as forest_artifact:
+            self.assertIs(self.registry.get(), loaded)
+        forest_artifact.assert_not_called()
+
+    def test_bad_replacements_keep_serving_the_previous_model(self):
+        self.install(self.artifacts['a'][0])
+        loaded = self.registry.get()
+
+        with open(self.artifacts['b'][0], 'rb') as f:
+            data = f.read()
+        with open(self.duplicate_features, 'rb') as f:
+            duplicates = f.read()
+        # Garbage, a header cut short, arrays cut short, and a refused feature list
+        for bad in (b'not a model artifact', data[:20], data[:len(data) // 2], duplicates):
+            self.install_bytes(bad)
+            self.assertIs(self.registry.get(), loaded)
+
+        self.install(self.artifacts['b'][0])
+        self.assertEqual(self.registry.get().version, self.artifacts['b'][1])
+
+    def test_bad_artifact_without_a_previous_model(self):
+        self.install(self.duplicate_features)
+        with self.assertRaisesMessage(ModelNotAvailable, 'duplicates'):
+            self.registry.get()
+
+    def test_missing_file(self):
+        with self.assertRaisesMessage(ModelNotAvailable, 'not found'):
+            self.registry.get()
+
+        # Once a model is serving, a briefly missing file doesn't take it away
+        self.install(self.artifacts['a'][0])
+        loaded = self.registry.get()
+        os.remove(self.path)
+        self.assertIs(self.registry.get(), loaded)
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = PredictionCache(max_size=2)
+        cache.put('v1', 0b01, 'a')
+        cache.put('v1', 0b10, 'b')
+        cache.get('v1', 0b01)
+        cache.put('v1', 0b11, 'c')
+
+        self.assertIsNone(cache.get('v1', 0b10))
+        self.assertEqual(cache.get('v1', 0b01), 'a')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_new_model_version_invalidates(self):
+        cache = PredictionCache(max_size=2)
+        cache.put('v1', 0b01, 'a')
+
+        self.assertIsNone(cache.get('v2', 0b01))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+
+class HashingPoolTests(SimpleTestCase):
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_MAX_QUEUE=1)
+    def test_rejects_calls_beyond_the_queue_limit(self):
+        pool = HashingPool()
+        release = threading.Event()
+
+        async def burst():
+            running = asyncio.ensure_future(pool.run(release.wait))
+            queued = asyncio.ensure_future(pool.run(release.wait))
+            await asyncio.sleep(0)
+            with self.assertRaises(HashingPoolBusy):
+                await pool.run(release.wait)
+            release.set()
+            return await asyncio.gather(running, queued)
+
+        self.assertEqual(asyncio.run(burst()), [True, True])
+        self.assertEqual(pool.stats()['rejected'], 1)
+        self.assertEqual(pool.stats()['completed'], 2)
+
+
+@override_settings(REPLICA_DATABASE_ALIAS='replica')
+class ReplicaRouterTests(SimpleTestCase):
+    def route(self, request, write_first=False):
+        router = ReplicaRouter()
+
+        @read_only_view
+        def view(request):
+            if write_first:
+                router.db_for_write(User)
+            return HttpResponse(router.db_for_read(User))
+
+        return ReplicaPinMiddleware(view)(request)
+
+    def test_reads_in_read_only_views_use_the_replica(self):
+        self.assertEqual(self.route(RequestFactory().get('/')).content, b'replica')
+        self.assertEqual(self.route(RequestFactory().post('/')).content, b'default')
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        response = self.route(RequestFactory().get('/'), write_first=True)
+        self.assertEqual(response.content, b'default')
+
+        # The client's next requests are pinned by the cookie
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.route(request).content, b'default')
+
+
+# Signup and login hash on the pool's threads; a fast hasher keeps these tests quick
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AccountAuthTests(TestCase):
+    def setUp(self):
+        PlatformCoin.objects.create(id=1, coins=1000)
+        User.objects.create(username='amina', email='amina@example.com', password=make_password('s3cret'), is_farmer=True)
+        User.objects.create(username='dr_otieno', email='otieno@example.com', password=make_password('s3cret'), is_vet=True)
+
+    async def post(self, url, body):
+        return await self.async_client.post(url, json.dumps(body), content_type='application/json')
+
+    async def test_signup_creates_the_account_and_pays_the_bonus(self):
+        await CertifiedVet.objects.acreate(email='wanjiru@example.com')
+
+        response = await self.post('/signup/', {
+            'username': 'baraka', 'email': 'baraka@example.com', 'password': 'pw', 'is_farmer': True,
+        })
+        self.assertEqual(response.status_code, 201)
+        response = await self.post('/signup/', {
+            'username': 'dr_wanjiru', 'email': 'wanjiru@example.com', 'password': 'pw', 'is_vet': True,
+        })
+        self.assertEqual(response.status_code, 201)
+
+        farmer = await User.objects.aget(username='baraka')
+        self.assertTrue(check_password('pw', farmer.password))
+        self.assertTrue(await FarmerProfile.objects.filter(user=farmer).aexists())
+        self.assertEqual((await CoinReward.objects.aget(user=farmer)).coins, 100)
+        self.assertEqual((await CoinReward.objects.aget(user__username='dr_wanjiru')).coins, 200)
+        self.assertEqual(await sync_to_async(PlatformCoin.total_coins)(), 700)
+
+    async def test_signup_rejects_a_taken_username(self):
+        response = await self.post('/signup/', {'username': 'amina', 'email': 'new@example.com', 'password': 'pw'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await sync_to_async(PlatformCoin.total_coins)(), 1000)
+
+    async def test_login(self):
+        response = await self.post('/farmer-login/', {'username': 'amina', 'password': 's3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'amina@example.com')
+
+        response = await self.post('/vet-login/', {'username': 'dr_otieno', 'password': 's3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['user']['is_vet'])
+
+    async def test_login_with_a_wrong_password(self):
+        for url, username in (('/farmer-login/', 'amina'), ('/vet-login/', 'dr_otieno')):
+            response = await self.post(url, {'username': username, 'password': 'wrong'})
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.json()['error'], 'Invalid password.')
+
+        # A farmer is not a vet
+        response = await self.post('/vet-login/', {'username': 'amina', 'password': 's3cret'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_saturated_hashing_pool_asks_clients_to_retry(self):
+        requests = [
+            ('/signup/', {'username': 'baraka', 'email': 'baraka@example.com', 'password': 'pw', 'is_farmer': True}),
+            ('/farmer-login/', {'username': 'amina', 'password': 's3cret'}),
+            ('/vet-login/', {'username': 'dr_otieno', 'password': 's3cret'}),
+        ]
+        with mock.patch.object(hashing_pool, 'run', side_effect=HashingPoolBusy('Too many password checks in progress.')):
+            for url, body in requests:
+                response = await self.post(url, body)
+                self.assertEqual(response.status_code, 503, url)
+                self.assertEqual(response['Retry-After'], '1')
+
+        self.assertFalse(await User.objects.filter(username='baraka').aexists())
+        self.assertEqual(await sync_to_async(PlatformCoin.total_coins)(), 1000)
+
+
+class ChargeAppointmentTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True)
+        self.vet = User.objects.create(username='vet', email='vet@example.com', is_vet=True)
+        CoinReward.objects.create(user=self.farmer, coins=7)
+        PlatformCoin.objects.create(id=1, coins=0)
+
+    def book(self):
+        with transaction.atomic():
+            appointment = Appointment.objects.create(farmer=self.farmer, vet=self.vet)
+            charge_appointment(self.farmer, self.vet, appointment)
+
+    def test_moves_fee_and_records_ledger(self):
+        self.book()
+
+        self.assertEqual(CoinReward.objects.get(user=self.farmer).coins, 2)
+        self.assertEqual(CoinReward.objects.get(user=self.vet).coins, 2)
+        self.assertEqual(PlatformCoin.total_coins(), 3)
+        self.assertEqual(sum(CoinTransaction.objects.values_list('amount', flat=True)), 0)
+
+    def test_insufficient_coins_rolls_everything_back(self):
+        self.book()
+        with self.assertRaises(ValueError):
+            self.book()
+
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(CoinReward.objects.get(user=self.farmer).coins, 2)
+        self.assertEqual(CoinTransaction.objects.count(), 3)
+
+
+class PlatformCoinShardTests(TestCase):
+    def setUp(self):
+        self.platform = PlatformCoin.objects.create(id=1, coins=100)
+
+    def test_credits_are_spread_over_shards(self):
+        for _ in range(20):
+            self.platform.add_coins(3)
+
+        self.assertEqual(PlatformCoin.objects.get(id=1).coins, 100)
+        self.assertEqual(PlatformCoinShard.total_coins(), 60)
+        self.assertEqual(PlatformCoin.total_coins(), 160)
+
+    def test_debit_larger_than_any_row_drains_across_rows(self):
+        for _ in range(10):
+            self.platform.add_coins(10)
+
+        self.platform.subtract_coins(150)
+        self.assertEqual(PlatformCoin.total_coins(), 50)
+
+        with self.assertRaises(ValueError):
+            self.platform.subtract_coins(51)
+        self.assertEqual(PlatformCoin.total_coins(), 50)
+
+    def test_compact_preserves_total(self):
+        self.platform.add_coins(7)
+
+        self.assertEqual(PlatformCoin.compact(), 107)
+        self.assertEqual(PlatformCoin.total_coins(), 107)
+        self.assertEqual(PlatformCoin.objects.get(id=1).coins, 107 % settings.PLATFORM_COIN_SHARDS)
+
+    def test_credit_checks_the_cap_without_aggregating(self):
+        PlatformCoinShard.ensure_slots()
+        with self.assertNumQueries(1):
+            PlatformCoin.credit(5)
+
+    @override_settings(PLATFORM_COIN_SHARDS=2)
+    def test_credit_refused_when_shards_are_full(self):
+        with mock.patch.object(PlatformCoin, 'MAX_BALANCE', 100):
+            PlatformCoin.credit(50)
+            PlatformCoin.credit(50)
+            with self.assertRaisesMessage(ValueError, 'limit exceeded'):
+                PlatformCoin.credit(1)
+        self.assertEqual(PlatformCoinShard.total_coins(), 100)
+
+    def test_compaction_reports_a_balance_over_the_cap(self):
+        stderr = io.StringIO()
+        with mock.patch.object(PlatformCoin, 'MAX_BALANCE', 50):
+            call_command('compact_platform_coins', stdout=io.StringIO(), stderr=stderr)
+
+        self.assertIn('over the 50 coin cap', stderr.getvalue())
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True)
+        self.vet = User.objects.create(username='vet', email='vet@example.com', is_vet=True)
+        PlatformCoin.objects.create(id=1, coins=0)
+
+    def failing_handler(self, messages):
+        raise ConnectionError('SMS gateway unreachable')
+
+    def test_failed_booking_rolls_back_its_notification_intents(self):
+        CoinReward.objects.create(user=self.farmer, coins=0)
+
+        response = self.client.post('/appointments/', json.dumps({
+            'farmer_username': 'farmer', 'vet_username': 'vet',
+        }), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b'Insufficient coins', response.content)
+        self.assertFalse(Appointment.objects.exists())
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_batch_is_delivered_once(self):
+        enqueue_notifications([(self.farmer, 'one'), (self.vet, 'two'), (self.farmer, 'three')])
+
+        self.assertEqual(deliver_pending(), (3, 0))
+        self.assertEqual(deliver_pending(), (0, 0))
+        self.assertEqual(sorted(Notification.objects.values_list('message', flat=True)), ['one', 'three', 'two'])
+        self.assertFalse(NotificationOutbox.objects.filter(delivered_at__isnull=True).exists())
+
+    def test_raising_handler_leaves_messages_pending_with_the_error(self):
+        enqueue_notifications([(self.farmer, 'one'), (self.vet, 'two')])
+
+        with mock.patch.dict(CHANNEL_HANDLERS, {'in_app': self.failing_handler}):
+            self.assertEqual(deliver_pending(), (0, 2))
+
+        self.assertFalse(Notification.objects.exists())
+        for message in NotificationOutbox.objects.all():
+            self.assertIsNone(message.delivered_at)
+            self.assertEqual(message.attempts, 1)
+            self.assertEqual(message.last_error, 'SMS gateway unreachable')
+
+    def test_messages_stop_after_max_delivery_attempts(self):
+        enqueue_notifications([(self.farmer, 'one')])
+
+        with mock.patch.dict(CHANNEL_HANDLERS, {'in_app': self.failing_handler}):
+            for _ in range(MAX_DELIVERY_ATTEMPTS):
+                self.assertEqual(deliver_pending(), (0, 1))
+            self.assertEqual(deliver_pending(), (0, 0))
+
+        # Not picked up again even once the channel works
+        self.assertEqual(deliver_pending(), (0, 0))
+        self.assertEqual(NotificationOutbox.objects.get().attempts, MAX_DELIVERY_ATTEMPTS)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.status = 200
+
+        @idempotent
+        def view(request):
+            self.calls += 1
+            User.objects.create(username=f'user{self.calls}', email=f'user{self.calls}@example.com')
+            if self.status == 'retry':
+                # A retry that finds the claim before this request has stored its response
+                self.status = 200
+                return view(post({'coins': 5}))
+            return JsonResponse({'call': self.calls}, status=self.status)
+
+        def post(body, key='key-1'):
+            return RequestFactory().post(
+                '/', data=json.dumps(body), content_type='application/json', HTTP_IDEMPOTENCY_KEY=key,
+            )
+
+        self.view, self.post = view, post
+
+    def test_retry_with_same_key_and_body_replays_the_response(self):
+        first = self.view(self.post({'coins': 5}))
+        retry = self.view(self.post({'coins': 5}))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.view(self.post({'coins': 5}, key='key-2')).status_code, 200)
+        self.assertEqual(self.calls, 2)
+
+    def test_same_key_with_a_different_body_is_rejected(self):
+        self.view(self.post({'coins': 5}))
+
+        self.assertEqual(self.view(self.post({'coins': 500})).status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_retry_while_the_first_request_runs_gets_409(self):
+        self.status = 'retry'
+
+        self.assertEqual(self.view(self.post({'coins': 5})).status_code, 409)
+        self.assertEqual(self.calls, 1)
+
+    def test_server_error_releases_the_key_and_rolls_back(self):
+        self.status = 500
+        self.assertEqual(self.view(self.post({'coins': 5})).status_code, 500)
+        self.assertFalse(User.objects.exists())
+
+        self.status = 200
+        self.assertEqual(self.view(self.post({'coins': 5})).status_code, 200)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_exception_in_view_releases_the_key(self):
+        @idempotent
+        def broken(request):
+            User.objects.create(username='broken', email='broken@example.com')
+            raise RuntimeError('worker died')
+
+        with self.assertRaises(RuntimeError):
+            broken(self.post({'coins': 5}))
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+
+class AccountSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True, wallet_balance=10.0)
+        CoinReward.objects.create(user=self.user, coins=4)
+
+    def summary(self):
+        return self.client.get('/account-summary/', {'username': 'farmer'}).json()
+
+    def test_summary_is_cached_until_a_write_invalidates_it(self):
+        self.assertEqual(self.summary(), {
+            'wallet_balance': 10.0, 'coin_balance': 4, 'unread_notifications': 0, 'pending_appointments': 0,
+        })
+
+        # Writes that bypass the views are only picked up after the TTL
+        CoinReward.objects.filter(user=self.user).update(coins=9)
+        self.assertEqual(self.summary()['coin_balance'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/deposit-coins/', {'username': 'farmer', 'coins': 1}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.summary()['coin_balance'], 10)
+
+    def test_unread_count_is_never_cached(self):
+        self.assertEqual(self.summary()['unread_notifications'], 0)
+
+        # As the outbox delivers them, from another process, without invalidating anything
+        Notification.objects.bulk_create([Notification(recipient=self.user, message='hi') for _ in range(2)])
+        self.assertEqual(self.summary()['unread_notifications'], 2)
+
+
+class ImportUsersTests(TestCase):
+    def test_imports_new_farmers_and_pays_bonuses(self):
+        PlatformCoin.objects.create(id=1, coins=1000)
+        User.objects.create(username='taken', email='taken@example.com', is_farmer=True)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('username,email,is_farmer,location_lat,location_lng\n')
+            f.write('amina,amina@example.com,true,-1.29,36.82\n')
+            f.write('taken,other@example.com,true,,\n')
+            f.write('baraka,baraka@example.com,yes,,\n')
+        self.addCleanup(os.remove, f.name)
+
+        call_command('import_users', f.name, password='secret', stdout=io.StringIO(), stderr=io.StringIO())
+
+        amina = User.objects.get(username='amina')
+        self.assertTrue(amina.geohash)
+        self.assertEqual(amina.password, User.objects.get(username='baraka').password)
+        self.assertEqual(FarmerProfile.objects.count(), 2)
+        self.assertEqual(CoinReward.objects.get(user=amina).coins, 100)
+        self.assertEqual(PlatformCoin.total_coins(), 800)
+
+    def test_skipped_rows_are_reported_without_their_passwords(self):
+        PlatformCoin.objects.create(id=1, coins=1000)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('username,email,password,is_farmer\n')
+            f.write('amina,,hunter2,true\n')
+            f.write(',baraka@example.com,correct-horse,true\n')
+        self.addCleanup(os.remove, f.name)
+
+        stderr = io.StringIO()
+        call_command('import_users', f.name, stdout=io.StringIO(), stderr=stderr)
+
+        output = stderr.getvalue()
+        self.assertIn('Skipping line 2 (amina)', output)
+        self.assertIn('Skipping line 3 (no username)', output)
+        self.assertNotIn('hunter2', output)
+        self.assertNotIn('correct-horse', output)
+
+
+class ResolveUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True)
+
+    def test_hot_users_skip_the_lookup_query(self):
+        with self.assertNumQueries(2):
+            self.client.get('/get-unread-count/', {'username': 'farmer'})
+        with self.assertNumQueries(1):
+            response = self.client.get('/get-unread-count/', {'username': 'farmer'})
+        self.assertEqual(response.json(), {'unread_count': 0})
+
+    def test_update_profile_refreshes_cached_location(self):
+        self.client.get('/nearby-vets/', {'username': 'farmer'})
+
+        self.client.patch(
+            '/update-profile/', {'username': 'farmer', 'location_lat': -1.29, 'location_lng': 36.82},
+            content_type='application/json'
+        )
+        response = self.client.get('/nearby-vets/', {'username': 'farmer'})
+        self.assertEqual(response.status_code, 200)
+
+
+class NearbyVetsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True, location_lat=0.0, location_lng=37.0)
+        for name, lat, lng in (('east', 0.0, 37.2), ('north', 0.5, 37.0), ('far-north', 1.0, 37.0), ('remote', 3.0, 37.0)):
+            User.objects.create(username=name, email=f'{name}@example.com', is_vet=True, location_lat=lat, location_lng=lng)
+
+    def get(self, **params):
+        return self.client.get('/nearby-vets/', {'username': 'farmer', **params})
+
+    def test_default_radius(self):
+        self.assertEqual([vet['username'] for vet in self.get().json()], ['east'])
+
+    def test_radius_sorts_by_great_circle_distance(self):
+        vets = self.get(radius_km=120).json()
+
+        self.assertEqual([vet['username'] for vet in vets], ['east', 'north', 'far-north'])
+        # One degree of latitude on a sphere of radius 6371.0088 km
+        self.assertEqual(vets[2]['distance_km'], 111.2)
+        self.assertEqual(vets[0]['distance_km'], 22.24)
+
+    def test_limit_keeps_the_closest(self):
+        self.assertEqual([vet['username'] for vet in self.get(radius_km=120, limit=2).json()], ['east', 'north'])
+
+    def test_unsorted(self):
+        vets = self.get(radius_km=400, sort='none').json()
+
+        self.assertEqual({vet['username'] for vet in vets}, {'east', 'north', 'far-north', 'remote'})
+
+    def test_validation(self):
+        for params in ({'radius_km': 0}, {'radius_km': 501}, {'radius_km': 'far'}, {'limit': 0}, {'limit': 501},
+                       {'k': 0}, {'sort': 'name'}, {'username': 'east'}, {'username': ''}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+
+class VetIndexTests(TestCase):
+    def setUp(self):
+        vet_index.invalidate()
+        self.farmer = User.objects.create(
+            username='farmer', email='farmer@example.com', is_farmer=True, location_lat=-1.2921, location_lng=36.8219,
+        )
+        # Nairobi, Thika, Nakuru and Mombasa
+        for name, lat, lng in (('nairobi', -1.2864, 36.8172), ('thika', -1.0333, 37.0693),
+                               ('nakuru', -0.3031, 36.0800), ('mombasa', -4.0435, 39.6682)):
+            User.objects.create(username=name, email=f'{name}@example.com', is_vet=True, location_lat=lat, location_lng=lng)
+
+    def test_nearest_returns_k_closest_first_with_haversine_distances(self):
+        nearest = vet_index.nearest(-1.2921, 36.8219, 3)
+
+        self.assertEqual([vet[1] for vet in nearest], ['nairobi', 'thika', 'nakuru'])
+        expected = haversine_km(-1.2921, 36.8219, [-1.2864, -1.0333, -0.3031], [36.8172, 37.0693, 36.0800])
+        np.testing.assert_allclose([vet[3] for vet in nearest], expected)
+        self.assertEqual(len(vet_index.nearest(-1.2921, 36.8219, 50)), 4)
+
+    def test_k_with_radius_drops_vets_outside_the_radius(self):
+        response = self.client.get('/nearby-vets/', {'username': 'farmer', 'k': 4, 'radius_km': 150})
+
+        self.assertEqual([vet['username'] for vet in response.json()], ['nairobi', 'thika', 'nakuru'])
+        self.assertTrue(all(vet['distance_km'] <= 150 for vet in response.json()))
+
+    def test_new_vet_is_indexed_once_its_transaction_commits(self):
+        vet_index.nearest(0, 37, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(username='isiolo', email='isiolo@example.com', is_vet=True, location_lat=0.35, location_lng=37.58)
+            # Still the snapshot from before the write
+            self.assertEqual(vet_index.nearest(0, 37, 1)[0][1], 'nakuru')
+        self.assertEqual(vet_index.nearest(0, 37, 1)[0][1], 'isiolo')
+
+
+class AppointmentListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        farmer = User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True)
+        vet = User.objects.create(username='vet', email='vet@example.com', is_vet=True)
+        statuses = ['pending', 'approved', 'pending', 'cancelled', 'pending']
+        self.appointments = [Appointment.objects.create(farmer=farmer, vet=vet, status=s) for s in statuses]
+        # Three share one timestamp, so pages have to break ties on id
+        now = timezone.now()
+        Appointment.objects.filter(id__in=[a.id for a in self.appointments[:3]]).update(time_sent=now)
+        Appointment.objects.filter(id__in=[a.id for a in self.appointments[3:]]).update(time_sent=now - timedelta(hours=1))
+
+    def get(self, **params):
+        return self.client.get('/appointments/', {'username': 'farmer', **params})
+
+    def test_pages_split_equal_timestamps_without_gaps_or_repeats(self):
+        ids, pages, cursor = [], 0, None
+        while True:
+            response = self.get(limit=2, **({'cursor': cursor} if cursor else {}))
+            ids += [a['id'] for a in response.json()]
+            pages += 1
+            cursor = response.get(NEXT_CURSOR_HEADER)
+            if cursor is None:
+                break
+
+        a = [appointment.id for appointment in self.appointments]
+        self.assertEqual(ids, [a[2], a[1], a[0], a[4], a[3]])
+        self.assertEqual(pages, 3)
+
+    def test_last_page_has_no_next_cursor(self):
+        response = self.get(limit=5)
+
+        self.assertEqual(len(response.json()), 5)
+        self.assertNotIn(NEXT_CURSOR_HEADER, response)
+
+    def test_status_filter(self):
+        response = self.get(status='pending')
+
+        self.assertEqual({a['status'] for a in response.json()}, {'pending'})
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(self.get(status='lost').status_code, 400)
+
+    def test_invalid_cursor_is_400(self):
+        for cursor in ('not-base64!', 'bm90LWEtY3Vyc29y'):
+            self.assertEqual(self.get(cursor=cursor).status_code, 400, cursor)
+
+    def test_usernames_come_from_the_page_query(self):
+        self.get()  # Caches the user lookup
+
+        # One query for the whole page, however many rows it has
+        with self.assertNumQueries(1):
+            response = self.get()
+        self.assertEqual({a['vet'] for a in response.json()}, {'vet'})
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        farmer = User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True)
+        other = User.objects.create(username='other', email='other@example.com', is_farmer=True)
+        self.notes = [
+            Notification.objects.create(recipient=farmer, message=str(i), is_read=i % 2 == 0) for i in range(5)
+        ]
+        Notification.objects.create(recipient=other, message='other')
+
+    def get(self, path='/get-notifications/', **params):
+        return self.client.get(path, {'username': 'farmer', **params})
+
+    def test_cursor_pages_cover_the_inbox_newest_first(self):
+        first = self.get(limit=3)
+        second = self.get(limit=3, cursor=first[NEXT_CURSOR_HEADER])
+
+        ids = [n['id'] for n in first.json() + second.json()]
+        self.assertEqual(ids, [n.id for n in reversed(self.notes)])
+        self.assertNotIn(NEXT_CURSOR_HEADER, second)
+        self.assertEqual(self.get(cursor='not-a-cursor').status_code, 400)
+
+    def test_unread_only(self):
+        response = self.get(unread_only='true')
+
+        self.assertEqual([n['id'] for n in response.json()], [self.notes[3].id, self.notes[1].id])
+        self.assertEqual(len(self.get(unread_only='false').json()), 5)
+
+    def test_unread_count(self):
+        self.assertEqual(self.get('/get-unread-count/').json(), {'unread_count': 2})
+        self.assertEqual(self.get('/get-unread-count/', username='nobody').status_code, 404)
+        self.assertEqual(self.client.get('/get-unread-count/').status_code, 400)
+
+
+class NotificationStreamTests(TestCase):
+    async def next_event(self, stream):
+        return (await asyncio.wait_for(anext(stream), timeout=5)).decode()
+
+    @override_settings(NOTIFICATION_STREAM_POLL_SECONDS=60)
+    async def test_publish_wakes_the_stream(self):
+        user = await User.objects.acreate(username='farmer', email='farmer@example.com', is_farmer=True)
+        await Notification.objects.acreate(recipient=user, message='before')
+
+        response = await self.async_client.get('/notification-stream/', {'username': 'farmer'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await self.next_event(stream), f'retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n')
+
+            # Let the stream find nothing new and start waiting on its subscription
+            pending = asyncio.ensure_future(self.next_event(stream))
+            await asyncio.sleep(0.1)
+            self.assertFalse(pending.done())
+
+            note = await Notification.objects.acreate(recipient=user, message='Your appointment has been scheduled.')
+            # What the post_save signal does once the row commits; the poll is far longer than the timeout
+            get_broker().publish(user_channel(user.id))
+
+            event = await pending
+            self.assertTrue(event.startswith(f'id: {note.id}\nevent: notification\n'))
+            self.assertEqual(json.loads(event.split('data: ')[1])['message'], 'Your appointment has been scheduled.')
+        finally:
+            await stream.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_POLL_SECONDS=0.1)
+    async def test_notification_delivered_through_the_outbox_reaches_an_open_stream(self):
+        user = await User.objects.acreate(username='farmer', email='farmer@example.com', is_farmer=True)
+
+        response = await self.async_client.get('/notification-stream/', {'username': 'farmer'})
+        stream = aiter(response.streaming_content)
+        try:
+            await self.next_event(stream)
+            pending = asyncio.ensure_future(self.next_event(stream))
+            await asyncio.sleep(0.1)
+
+            # As the deliver_notifications process does it: its publish never reaches this process
+            await sync_to_async(enqueue_notifications)([(user, 'Your appointment has been scheduled.')])
+            self.assertEqual(await sync_to_async(deliver_pending)(), (1, 0))
+
+            event = await pending
+            self.assertEqual(json.loads(event.split('data: ')[1])['message'], 'Your appointment has been scheduled.')
+        finally:
+            await stream.aclose()
+
+    async def test_last_event_id_resumes_after_that_notification(self):
+        user = await User.objects.acreate(username='farmer', email='farmer@example.com', is_farmer=True)
+        first = await Notification.objects.acreate(recipient=user, message='first')
+        second = await Notification.objects.acreate(recipient=user, message='second')
+
+        response = await self.async_client.get(
+            '/notification-stream/', {'username': 'farmer'}, headers={'Last-Event-ID': str(first.id)},
+        )
+        stream = aiter(response.streaming_content)
+        try:
+            await self.next_event(stream)
+            self.assertTrue((await self.next_event(stream)).startswith(f'id: {second.id}\n'))
+        finally:
+            await stream.aclose()
+
+
+class MarkNotificationsReadTests(TestCase):
+    def setUp(self):
+        self.farmer = User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True)
+        other = User.objects.create(username='other', email='other@example.com', is_farmer=True)
+        self.notes = [Notification.objects.create(recipient=self.farmer, message=str(i)) for i in range(4)]
+        self.others = Notification.objects.create(recipient=other, message='other')
+
+    def patch(self, body):
+        return self.client.patch('/mark-notification-as-read/', json.dumps(body), content_type='application/json')
+
+    def unread(self):
+        return sorted(Notification.objects.filter(is_read=False).values_list('id', flat=True))
+
+    def test_list_of_ids(self):
+        response = self.patch({'notification_ids': [self.notes[0].id, self.notes[2].id, self.others.id]})
+
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(self.unread(), [self.notes[1].id, self.notes[3].id])
+
+    def test_watermark_only_touches_the_users_inbox(self):
+        response = self.patch({'username': 'farmer', 'up_to_id': self.others.id})
+
+        self.assertEqual(response.json()['updated'], 4)
+        self.assertEqual(self.unread(), [self.others.id])
+
+    def test_single_unknown_id_is_404(self):
+        self.assertEqual(self.patch({'notification_id': self.notes[0].id}).json()['updated'], 1)
+        self.assertEqual(self.patch({'notification_id': 999999}).status_code, 404)
+
+    def test_ids_must_be_integers(self):
+        for body in ({'notification_ids': ['abc']}, {'notification_ids': [1, True]}, {'notification_id': 'x'},
+                     {'username': 'farmer', 'up_to_id': 'x'}, {'username': 'farmer', 'up_to_id': 1.5}):
+            self.assertEqual(self.patch(body).status_code, 400, body)
+        self.assertEqual(len(self.unread()), 5)
+
+
+class MetricsTests(TestCase):
+    def test_reports_route_latency_and_queries(self):
+        User.objects.create(username='farmer', email='farmer@example.com', is_farmer=True)
+        self.client.get('/favorite-vets/', {'username': 'farmer'})
+
+        text = self.client.get('/metrics/').content.decode()
+        self.assertIn('vetmashinani_request_duration_seconds_bucket{route="favorite-vets",le="+Inf"}', text)
+        self.assertIn('vetmashinani_responses_total{route="favorite-vets",status="200"}', text)
+        self.assertRegex(text, r'vetmashinani_request_db_queries_sum\{route="favorite-vets"\} [1-9]')
+
+
+class SeedDatabaseTests(TestCase):
+    def test_seeds_requested_rows_with_historical_timestamps(self):
+        counts = seed_database(vets=3, farmers=10, appointments=20, favorites=5, notifications=30, seed=1)
+
+        self.assertEqual(counts['vets'], 3)
+        self.assertEqual(CoinReward.objects.count(), 13)
+        self.assertEqual(Appointment.objects.count(), 20)
+        self.assertEqual(Notification.objects.count(), 30)
+        # The generated history is kept without touching auto_now_add
+        self.assertGreater(Notification.objects.dates('created_at', 'day').count(), 1)
+        self.assertGreater(Appointment.objects.dates('time_sent', 'day').count(), 1)
+        self.assertTrue(Notification._meta.get_field('created_at').auto_now_add)
+
+    def test_generate_data_adds_to_existing_users_and_books_mostly_local_vets(self):
+        seed_database(vets=20, farmers=50, seed=1)
+        call_command(
+            'generate_data', vets=20, farmers=50, appointments=500, favorites=0, notifications=0, prefix='more-',
+            stdout=io.StringIO(),
+        )
+
+        self.assertEqual(User.objects.count(), 140)
+        self.assertTrue(User.objects.filter(username='more-farmer0').exists())
+        self.assertEqual(CoinReward.objects.count(), 140)
+        vets, farmers = CountyPool('vet', random.Random(0)), CountyPool('farmer', random.Random(0))
+        county = dict(zip(vets.ids.tolist() + farmers.ids.tolist(), vets.county.tolist() + farmers.county.tolist()))
+        local = sum(county[a.farmer_id] == county[a.vet_id] for a in Appointment.objects.all())
+        # Counties without a vet fall back to any vet; a uniform pick would be local about 10% of the time
+        self.assertGreater(local / 500, 0.5)
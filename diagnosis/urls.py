@@ -6,13 +6,19 @@ from .views import (
     appointments,
     nearby_vets,
     predict_disease,
+    predict_disease_batch,
+    model_info,
+    metrics,
     deposit_coins,
     withdraw_coins,
     get_wallet_balance,
     get_coin_balance,
+    account_summary,
     favorite_vets,
     add_favorite,
     get_notifications,
+    get_unread_count,
+    notification_stream,
     mark_notification_as_read,
     update_profile
 )
@@ -25,12 +31,18 @@ urlpatterns = [
     path('appointments/', appointments, name="appointments"),
     path('nearby-vets/', nearby_vets, name="nearby-vets"),
     path("predict-disease/", predict_disease, name="predict-disease"),
+    path("predict-disease-batch/", predict_disease_batch, name="predict-disease-batch"),
+    path("model-info/", model_info, name="model-info"),
+    path("metrics/", metrics, name="metrics"),
     path("deposit-coins/", deposit_coins, name="deposit-coins"),
     path("withdraw-coins/", withdraw_coins, name="withdraw-coins"),
     path('get-wallet-balance/', get_wallet_balance, name='get-wallet-balance'),
     path('get-coin-balance/', get_coin_balance, name='get-coin-balance'),
+    path('account-summary/', account_summary, name='account-summary'),
     path('favorite-vets/', favorite_vets, name='favorite-vets'),
     path('add-favorite/', add_favorite, name='add-favorite'),
     path('get-notifications/', get_notifications, name='get-notifications'),
+    path('get-unread-count/', get_unread_count, name='get-unread-count'),
+    path('notification-stream/', notification_stream, name='notification-stream'),
     path('mark-notification-as-read/', mark_notification_as_read, name='mark-notification-as-read'),
 ]
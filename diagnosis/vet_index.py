@@ -0,0 +1,98 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from sklearn.neighbors import BallTree
+
+from .geo import EARTH_RADIUS_KM
+
+
+class VetIndex:
+    """
+    In-memory BallTree over vet coordinates for k-nearest queries.
+
+    Built lazily from the database on first use and rebuilt after
+    invalidate(), which the User signals call once a change to a vet's
+    location in this process has committed. Other workers can't signal us, so the tree is
+    also rebuilt once it is older than VET_INDEX_MAX_AGE seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._snapshot = None
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def _load_vets(self):
+        from .models import User
+
+        return list(
+            User.objects.filter(is_vet=True, location_lat__isnull=False, location_lng__isnull=False)
+            .values_list('id', 'username', 'email', 'location_lat', 'location_lng')
+        )
+
+    def _is_fresh(self, snapshot):
+        return (
+            snapshot is not None
+            and snapshot['generation'] == self._generation
+            and time.monotonic() - snapshot['built_at'] < settings.VET_INDEX_MAX_AGE
+        )
+
+    def _get_snapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        # One thread rebuilds; the others wait for it and reuse its result
+        with self._build_lock:
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+
+            generation = self._generation
+            rows = self._load_vets()
+            if rows:
+                ids, usernames, emails, lats, lngs = zip(*rows)
+                tree = BallTree(np.radians(np.column_stack([lats, lngs])), metric='haversine')
+            else:
+                ids, usernames, emails, tree = (), (), (), None
+
+            snapshot = {
+                'generation': generation,
+                'built_at': time.monotonic(),
+                'tree': tree,
+                'ids': ids,
+                'usernames': usernames,
+                'emails': emails,
+            }
+            # Swap the whole snapshot in one assignment so readers never see a mix
+            self._snapshot = snapshot
+            return snapshot
+
+    def nearest(self, lat, lng, k):
+        """Return up to ``k`` (id, username, email, distance_km) tuples, closest first."""
+        snapshot = self._get_snapshot()
+        if snapshot['tree'] is None:
+            return []
+
+        k = min(k, len(snapshot['ids']))
+        distances, indices = snapshot['tree'].query(np.radians([[lat, lng]]), k=k)
+        return [
+            (snapshot['ids'][i], snapshot['usernames'][i], snapshot['emails'][i], float(d) * EARTH_RADIUS_KM)
+            for d, i in zip(distances[0], indices[0])
+        ]
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'size': len(snapshot['ids']) if snapshot else 0,
+            'age_seconds': time.monotonic() - snapshot['built_at'] if snapshot else None,
+        }
+
+
+vet_index = VetIndex()
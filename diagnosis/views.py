@@ -1,26 +1,99 @@
 # Standard library imports
-import os
-import pickle
+import asyncio
 import json
 
 # Third-party imports
 import numpy as np
 from django.conf import settings
-from django.http import JsonResponse, HttpResponseNotAllowed, HttpResponseBadRequest, HttpResponseNotFound
+from django.http import HttpResponse, JsonResponse, HttpResponseNotAllowed, HttpResponseBadRequest, HttpResponseNotFound, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import get_object_or_404
-from geopy.distance import geodesic
-from django.contrib.auth.hashers import make_password, check_password
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 
 # Local app imports
 from .models import User,CertifiedVet, VeterinarianProfile, FarmerProfile, Appointment, Notification, Favorite, CoinReward, PlatformCoin
+from .ml import model_registry, ModelNotAvailable
+from .geo import bounding_box, geohash_search_cells, haversine_km
+from .vet_index import vet_index
+from .pagination import keyset_page, paginated_response, parse_page_size
+from .outbox import enqueue_notifications
+from .ledger import charge_appointment, signup_bonus
+from .idempotency import idempotent
+from .pubsub import get_broker, user_channel
+from .caches import get_account_summary, invalidate_account_summaries
+from .hashing import HashingPoolBusy, hashing_pool
+from .resolver import invalidate_user, resolve_user
+from .db_routers import read_only_view
+from .metrics import render as render_metrics
 
 # Django timezone import
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+def _signup_error(username, email, is_vet):
+    # Check if username or email already exists
+    if User.objects.filter(username=username).exists():
+        return JsonResponse({"error": "Username already taken."}, status=400)
+
+    if User.objects.filter(email=email).exists():
+        return JsonResponse({"error": "Email already in use."}, status=400)
+
+    # If user is a vet, ensure email exists in CertifiedVet table
+    if is_vet and not CertifiedVet.objects.filter(email=email).exists():
+        return JsonResponse({"error": "Email not found in Certified Veterinarians registry."}, status=403)
+
+    return None
+
+def _create_account(username, email, password_hash, is_farmer, is_vet, location_lat, location_lng):
+    # Determine coin bonus
+    bonus_coins = signup_bonus(is_farmer, is_vet)
+
+    platform = PlatformCoin.objects.first()
+    if platform is None:
+        return JsonResponse({"error": "PlatformCoin account not initialized."}, status=500)
+
+    try:
+        # The bonus debit, the user and its profile and reward commit together
+        with transaction.atomic():
+            # Deduct coins from platform account
+            platform.subtract_coins(bonus_coins)
+
+            # Create the user
+            user = User.objects.create(
+                username=username,
+                email=email,
+                password=password_hash,
+                is_farmer=is_farmer,
+                is_vet=is_vet,
+                location_lat=location_lat,
+                location_lng=location_lng
+            )
+
+            # Create related profile and reward
+            if is_vet:
+                VeterinarianProfile.objects.create(user=user)
+            elif is_farmer:
+                FarmerProfile.objects.create(user=user)
+
+            CoinReward.objects.create(user=user, coins=bonus_coins)
+            invalidate_user(username)
+    except ValueError as ve:
+        return JsonResponse({"error": str(ve)}, status=400)
+    except IntegrityError:
+        # Taken by a concurrent signup after the checks above
+        return JsonResponse({"error": "Username or email already in use."}, status=400)
+
+    return JsonResponse({"message": "User created successfully!"}, status=201)
+
+def _hashing_busy_response():
+    response = JsonResponse({"error": "Server busy, please retry shortly."}, status=503)
+    response['Retry-After'] = '1'
+    return response
 
 @csrf_exempt
-def signup(request):
+async def signup(request):
     if request.method == 'POST':
         data = json.loads(request.body)
 
@@ -33,49 +106,19 @@ def signup(request):
         location_lat = data.get('location_lat')
         location_lng = data.get('location_lng')
 
-        # Check if username or email already exists
-        if User.objects.filter(username=username).exists():
-            return JsonResponse({"error": "Username already taken."}, status=400)
+        error = await sync_to_async(_signup_error)(username, email, is_vet)
+        if error:
+            return error
 
-        if User.objects.filter(email=email).exists():
-            return JsonResponse({"error": "Email already in use."}, status=400)
-
-        # If user is a vet, ensure email exists in CertifiedVet table
-        if is_vet and not CertifiedVet.objects.filter(email=email).exists():
-            return JsonResponse({"error": "Email not found in Certified Veterinarians registry."}, status=403)
-
-        # Determine coin bonus
-        bonus_coins = 200 if is_vet else 100 if is_farmer else 0
-
-        # Deduct coins from platform account
+        # Hash off the event loop so other requests keep being served
         try:
-            platform = PlatformCoin.objects.first()
-            if platform is None:
-                return JsonResponse({"error": "PlatformCoin account not initialized."}, status=500)
-            platform.subtract_coins(bonus_coins)
-        except ValueError as ve:
-            return JsonResponse({"error": str(ve)}, status=400)
-
-        # Create the user
-        user = User.objects.create(
-            username=username,
-            email=email,
-            password=make_password(password),
-            is_farmer=is_farmer,
-            is_vet=is_vet,
-            location_lat=location_lat,
-            location_lng=location_lng
-        )
-
-        # Create related profile and reward
-        if is_vet:
-            VeterinarianProfile.objects.create(user=user)
-        elif is_farmer:
-            FarmerProfile.objects.create(user=user)
-
-        CoinReward.objects.create(user=user, coins=bonus_coins)
+            password_hash = await hashing_pool.make_password(password)
+        except HashingPoolBusy:
+            return _hashing_busy_response()
 
-        return JsonResponse({"message": "User created successfully!"}, status=201)
+        return await sync_to_async(_create_account)(
+            username, email, password_hash, is_farmer, is_vet, location_lat, location_lng
+        )
 
 @csrf_exempt
 def update_profile(request):
@@ -101,13 +144,14 @@ def update_profile(request):
 
         # Save the updated user with new location data
         user.save()
+        invalidate_user(user.username)
 
         return JsonResponse({"message": "Location updated successfully!"}, status=200)
 
     return JsonResponse({"error": "Invalid request method."}, status=405)
 
 @csrf_exempt
-def vet_login(request):
+async def vet_login(request):
     if request.method == 'POST':
         data = json.loads(request.body)
 
@@ -115,11 +159,16 @@ def vet_login(request):
         password = data.get('password')
 
         try:
-            user = User.objects.get(username=username, is_vet=True)
+            user = await User.objects.aget(username=username, is_vet=True)
         except User.DoesNotExist:
             return JsonResponse({"error": "Invalid vet credentials."}, status=400)
 
-        if not check_password(password, user.password):
+        try:
+            password_ok = await hashing_pool.check_password(password, user.password)
+        except HashingPoolBusy:
+            return _hashing_busy_response()
+
+        if not password_ok:
             return JsonResponse({"error": "Invalid password."}, status=400)
 
         response_data = {
@@ -135,7 +184,7 @@ def vet_login(request):
     return JsonResponse({"error": "Invalid request method."}, status=405)
 
 @csrf_exempt
-def farmer_login(request):
+async def farmer_login(request):
     if request.method == 'POST':
         data = json.loads(request.body)
 
@@ -143,11 +192,16 @@ def farmer_login(request):
         password = data.get('password')
 
         try:
-            user = User.objects.get(username=username, is_farmer=True)
+            user = await User.objects.aget(username=username, is_farmer=True)
         except User.DoesNotExist:
             return JsonResponse({"error": "Invalid farmer credentials."}, status=400)
 
-        if not check_password(password, user.password):
+        try:
+            password_ok = await hashing_pool.check_password(password, user.password)
+        except HashingPoolBusy:
+            return _hashing_busy_response()
+
+        if not password_ok:
             return JsonResponse({"error": "Invalid password."}, status=400)
 
         response_data = {
@@ -164,6 +218,8 @@ def farmer_login(request):
 
 
 @csrf_exempt
+@idempotent
+@read_only_view
 def appointments(request):
     if request.method == 'GET':
         username = request.GET.get('username')
@@ -171,16 +227,38 @@ def appointments(request):
         if not username:
             return HttpResponseBadRequest("Missing username")
 
+        try:
+            limit = parse_page_size(request.GET.get('limit'))
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        status = request.GET.get('status')
+        if status and status not in dict(Appointment.STATUS_CHOICES):
+            return HttpResponseBadRequest("Invalid status filter")
+
         # Retrieve the user by username
-        user = get_object_or_404(User, username=username)
+        user = resolve_user(request, username)
+        if not user:
+            return HttpResponseNotFound("User not found")
 
         if user.is_farmer:
-            appointments = Appointment.objects.filter(farmer=user).order_by('-time_sent')
+            appointments = Appointment.objects.filter(farmer_id=user.id)
         elif user.is_vet:
-            appointments = Appointment.objects.filter(vet=user).order_by('-time_sent')
+            appointments = Appointment.objects.filter(vet_id=user.id)
         else:
             return HttpResponseBadRequest("User is neither a farmer nor a vet")
 
+        if status:
+            appointments = appointments.filter(status=status)
+
+        # Both usernames come from the same query instead of two lookups per row
+        appointments = appointments.select_related('farmer', 'vet')
+
+        try:
+            page, next_cursor = keyset_page(appointments, 'time_sent', request.GET.get('cursor'), limit)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
         data = [
             {
                 'id': a.id,
@@ -190,9 +268,9 @@ def appointments(request):
                 'vet': a.vet.username,
                 'vet_note': a.vet_note,
                 'time_sent': a.time_sent,
-            } for a in appointments
+            } for a in page
         ]
-        return JsonResponse(data, safe=False)
+        return paginated_response(JsonResponse(data, safe=False), next_cursor)
 
     elif request.method == 'POST':
         data = json.loads(request.body)
@@ -201,36 +279,23 @@ def appointments(request):
             farmer = User.objects.get(username=data['farmer_username'])
             vet = User.objects.get(username=data['vet_username'])
 
-            # Handle coin balances
-            farmer_coins, _ = CoinReward.objects.get_or_create(user=farmer)
+            with transaction.atomic():
+                # Create appointment with current timestamp
+                appointment = Appointment.objects.create(
+                    farmer=farmer,
+                    vet=vet,
+                    farmer_note=data.get('farmer_note', '')
+                )
 
-            # Deduct 5 coins
-            farmer_coins.subtract_coins(5)
+                # Deduct 5 coins from the farmer, reward the vet 2 and the platform 3
+                charge_appointment(farmer, vet, appointment)
 
-            # Reward vet 2 coins
-            vet_coins, _ = CoinReward.objects.get_or_create(user=vet)
-            vet_coins.add_coins(2)
-
-            # Add 3 coins to platform balance
-            platform_coin, _ = PlatformCoin.objects.get_or_create(id=1)
-            platform_coin.add_coins(3)
-
-            # Create appointment with current timestamp
-            appointment = Appointment.objects.create(
-                farmer=farmer,
-                vet=vet,
-                farmer_note=data.get('farmer_note', '')
-            )
-
-            # Send notifications
-            Notification.objects.create(
-                recipient=vet,
-                message=f"{farmer.username} has scheduled new appointment with you."
-            )
-            Notification.objects.create(
-                recipient=farmer,
-                message=f"Your appointment with {vet.username} has been scheduled."
-            )
+                # Queue notifications for the delivery worker
+                enqueue_notifications([
+                    (vet, f"{farmer.username} has scheduled new appointment with you."),
+                    (farmer, f"Your appointment with {vet.username} has been scheduled."),
+                ])
+                invalidate_account_summaries([farmer.id, vet.id])
 
             return JsonResponse({'message': 'Appointment created', 'id': appointment.id})
         except Exception as e:
@@ -266,16 +331,14 @@ def appointments(request):
         if status in ['approved', 'cancelled']:
             appointment.vet_status_updated_at = timezone.now()
 
-        appointment.save()
+        with transaction.atomic():
+            appointment.save()
 
-        Notification.objects.create(
-            recipient=appointment.farmer,
-            message=f"Your appointment with {appointment.vet.username} has been updated. Status: {status}"
-        )
-        Notification.objects.create(
-            recipient=appointment.vet,
-            message=f"Your appointment with {appointment.farmer.username} has been updated. Status: {status}"
-        )
+            enqueue_notifications([
+                (appointment.farmer, f"Your appointment with {appointment.vet.username} has been updated. Status: {status}"),
+                (appointment.vet, f"Your appointment with {appointment.farmer.username} has been updated. Status: {status}"),
+            ])
+            invalidate_account_summaries([appointment.farmer_id, appointment.vet_id])
 
         return JsonResponse({'message': 'Appointment updated successfully', 'id': appointment.id})
 
@@ -283,56 +346,219 @@ def appointments(request):
     return HttpResponseNotAllowed(['GET', 'POST', 'PUT'])
 
 @csrf_exempt
+@read_only_view
 def get_notifications(request):
     if request.method != 'GET':
         return HttpResponseNotAllowed(['GET'])
 
-    try:
-        username = request.GET.get('username')  # Get the username from query parameters
+    username = request.GET.get('username')  # Get the username from query parameters
 
-        if not username:
-            return JsonResponse({"error": "Username is required."}, status=400)
-        
-        user = User.objects.get(username=username)
-    except User.DoesNotExist:
+    if not username:
+        return JsonResponse({"error": "Username is required."}, status=400)
+
+    user = resolve_user(request, username)
+    if not user:
         return HttpResponseNotFound("User not found")
 
-    notes = Notification.objects.filter(recipient=user).order_by('-created_at')
+    try:
+        limit = parse_page_size(request.GET.get('limit'))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    notes = Notification.objects.filter(recipient_id=user.id)
+    if request.GET.get('unread_only', '').lower() in ('1', 'true', 'yes'):
+        notes = notes.filter(is_read=False)
+
+    try:
+        page, next_cursor = keyset_page(notes, 'created_at', request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
     data = [
         {
             'id': n.id,
             'message': n.message,
             'created_at': n.created_at,
             'is_read': n.is_read
-        } for n in notes
+        } for n in page
     ]
-    return JsonResponse(data, safe=False)
+    return paginated_response(JsonResponse(data, safe=False), next_cursor)
+
+@csrf_exempt
+async def notification_stream(request):
+    """
+    Server-sent events stream of new notifications for one user (ASGI only).
+
+    Sends notifications newer than last_id (or the Last-Event-ID header on
+    reconnect); without either, only notifications created after the
+    stream opens. The stream wakes on pub/sub messages and otherwise
+    re-checks the database every NOTIFICATION_STREAM_POLL_SECONDS: with the
+    default in-process broker, notifications delivered by the
+    deliver_notifications process are only picked up by that poll. A
+    keepalive comment goes out after NOTIFICATION_STREAM_KEEPALIVE idle
+    seconds, and the stream closes after NOTIFICATION_STREAM_MAX_SECONDS so
+    clients reconnect periodically.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    username = request.GET.get('username')
+    if not username:
+        return JsonResponse({"error": "Username is required."}, status=400)
+
+    user = await User.objects.filter(username=username).only('id').afirst()
+    if not user:
+        return HttpResponseNotFound("User not found")
+
+    last_id = request.GET.get('last_id') or request.headers.get('Last-Event-ID')
+    if last_id:
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            return JsonResponse({"error": "last_id must be a number."}, status=400)
+    else:
+        latest = await Notification.objects.filter(recipient=user).order_by('-id').values_list('id', flat=True).afirst()
+        last_id = latest or 0
+
+    async def events(last_id):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.NOTIFICATION_STREAM_MAX_SECONDS
+
+        with get_broker().subscribe(user_channel(user.id)) as subscription:
+            yield f"retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n"
+            last_sent = loop.time()
+            while True:
+                notes = Notification.objects.filter(recipient=user, id__gt=last_id).order_by('id')[:100]
+                async for n in notes:
+                    last_sent = loop.time()
+                    last_id = n.id
+                    payload = json.dumps({
+                        'id': n.id,
+                        'message': n.message,
+                        'created_at': n.created_at.isoformat(),
+                        'is_read': n.is_read
+                    })
+                    yield f"id: {n.id}\nevent: notification\ndata: {payload}\n\n"
+
+                now = loop.time()
+                if now - last_sent >= settings.NOTIFICATION_STREAM_KEEPALIVE:
+                    yield ": keepalive\n\n"
+                    last_sent = now
+                remaining = deadline - now
+                if remaining <= 0:
+                    return
+                await subscription.wait(min(settings.NOTIFICATION_STREAM_POLL_SECONDS, remaining))
+
+    response = StreamingHttpResponse(events(last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+@csrf_exempt
+@read_only_view
+def get_unread_count(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    username = request.GET.get('username')
+    if not username:
+        return JsonResponse({"error": "Username is required."}, status=400)
+
+    user = resolve_user(request, username)
+    if not user:
+        return HttpResponseNotFound("User not found")
+
+    # Answered from the (recipient, is_read, created_at) index alone
+    unread_count = Notification.objects.filter(recipient_id=user.id, is_read=False).count()
+    return JsonResponse({"unread_count": unread_count})
+
+MAX_MARK_READ_IDS = 1000
+
+def _is_id(value):
+    # bool is an int subclass, but true/false are not ids
+    return isinstance(value, int) and not isinstance(value, bool)
 
 @csrf_exempt
 def mark_notification_as_read(request):
+    """
+    Mark notifications as read with a single UPDATE.
+
+    Accepts one of:
+      - notification_id: a single notification (the original API)
+      - notification_ids: a list of ids
+      - up_to_id / up_to: everything up to and including this id or ISO
+        timestamp, for the recipient given by username
+    username scopes any of these to one recipient.
+    """
     if request.method == 'PATCH':
         try:
             # Parse the JSON body
             body = json.loads(request.body)
             notification_id = body.get('notification_id')
-
-            # Get the notification object or return 404 if it doesn't exist
-            notification = get_object_or_404(Notification, id=notification_id)
-
-            # Mark the notification as read
-            notification.is_read = True
-            notification.save()
+            notification_ids = body.get('notification_ids')
+            up_to_id = body.get('up_to_id')
+            up_to = body.get('up_to')
+            username = body.get('username')
+
+            if notification_id is not None and not _is_id(notification_id):
+                return JsonResponse({'status': 'error', 'message': 'notification_id must be an integer.'}, status=400)
+            if up_to_id is not None and not _is_id(up_to_id):
+                return JsonResponse({'status': 'error', 'message': 'up_to_id must be an integer.'}, status=400)
+
+            notes = Notification.objects.filter(is_read=False)
+
+            if username:
+                recipient = resolve_user(request, username)
+                if not recipient:
+                    return JsonResponse({'status': 'error', 'message': 'User not found.'}, status=404)
+                notes = notes.filter(recipient_id=recipient.id)
+
+            if notification_ids is not None:
+                if (
+                    not isinstance(notification_ids, list)
+                    or len(notification_ids) > MAX_MARK_READ_IDS
+                    or not all(_is_id(i) for i in notification_ids)
+                ):
+                    return JsonResponse({'status': 'error', 'message': f'notification_ids must be a list of at most {MAX_MARK_READ_IDS} ids.'}, status=400)
+                notes = notes.filter(id__in=notification_ids)
+            elif up_to_id is not None or up_to is not None:
+                # Watermarks only make sense for one recipient's inbox
+                if not username:
+                    return JsonResponse({'status': 'error', 'message': 'username is required with up_to_id or up_to.'}, status=400)
+                if up_to_id is not None:
+                    notes = notes.filter(id__lte=up_to_id)
+                if up_to is not None:
+                    up_to = parse_datetime(up_to)
+                    if up_to is None:
+                        return JsonResponse({'status': 'error', 'message': 'up_to must be an ISO 8601 timestamp.'}, status=400)
+                    notes = notes.filter(created_at__lte=up_to)
+            elif notification_id is not None:
+                notes = notes.filter(id=notification_id)
+            else:
+                return JsonResponse({'status': 'error', 'message': 'Provide notification_id, notification_ids, up_to_id or up_to.'}, status=400)
+
+            # Mark the notifications as read in one statement
+            updated = notes.update(is_read=True)
+
+            if notification_id is not None and notification_ids is None and not updated:
+                if not Notification.objects.filter(id=notification_id).exists():
+                    return JsonResponse({'status': 'error', 'message': 'Notification not found.'}, status=404)
 
             # Return success response
-            return JsonResponse({'status': 'success', 'message': 'Notification marked as read'})
+            return JsonResponse({'status': 'success', 'message': f'{updated} notification(s) marked as read', 'updated': updated})
 
         except Exception as e:
-            # Handle error (invalid or missing notification ID)
-            return JsonResponse({'status': 'error', 'message': str(e)})
+            # Handle error (malformed body)
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=400)
 
+DEFAULT_NEARBY_RADIUS_KM = 50
+MAX_NEARBY_RADIUS_KM = 500
+MAX_NEARBY_LIMIT = 500
+
 @csrf_exempt
+@read_only_view
 def nearby_vets(request):
     if request.method == 'GET':
         username = request.GET.get('username')
@@ -340,60 +566,182 @@ def nearby_vets(request):
             return HttpResponseBadRequest("Missing username")
 
         try:
-            user = User.objects.get(username=username, is_farmer=True)
-            if user.location_lat is None or user.location_lng is None:
-                return HttpResponseBadRequest("User location not set")
-        except User.DoesNotExist:
+            radius_km = float(request.GET.get('radius_km', DEFAULT_NEARBY_RADIUS_KM))
+            limit = request.GET.get('limit')
+            limit = int(limit) if limit else None
+            k = request.GET.get('k')
+            k = int(k) if k else None
+        except ValueError:
+            return HttpResponseBadRequest("radius_km, limit and k must be numbers")
+
+        if not 0 < radius_km <= MAX_NEARBY_RADIUS_KM:
+            return HttpResponseBadRequest(f"radius_km must be between 0 and {MAX_NEARBY_RADIUS_KM}")
+        if limit is not None and not 0 < limit <= MAX_NEARBY_LIMIT:
+            return HttpResponseBadRequest(f"limit must be between 1 and {MAX_NEARBY_LIMIT}")
+        if k is not None and not 0 < k <= MAX_NEARBY_LIMIT:
+            return HttpResponseBadRequest(f"k must be between 1 and {MAX_NEARBY_LIMIT}")
+
+        sort = request.GET.get('sort', 'distance')
+        if sort not in ('distance', 'none'):
+            return HttpResponseBadRequest("sort must be 'distance' or 'none'")
+
+        user = resolve_user(request, username)
+        if not user or not user.is_farmer:
             return HttpResponseBadRequest("Farmer not found")
+        if user.location_lat is None or user.location_lng is None:
+            return HttpResponseBadRequest("User location not set")
 
         lat, lng = float(user.location_lat), float(user.location_lng)
 
-        all_vets = User.objects.filter(is_vet=True, location_lat__isnull=False, location_lng__isnull=False)
-
-        data = []
-        for vet in all_vets:
-            distance = geodesic((lat, lng), (vet.location_lat, vet.location_lng)).km
-            if distance <= 50:
-                data.append({
-                    'id': vet.id,
-                    'username': vet.username,
-                    'email': vet.email,
+        # k closest vets regardless of distance (unless radius_km is also given),
+        # answered from the in-memory index without touching the vet rows
+        if k is not None:
+            nearest = vet_index.nearest(lat, lng, k)
+            if 'radius_km' in request.GET:
+                nearest = [vet for vet in nearest if vet[3] <= radius_km]
+            data = [
+                {
+                    'id': vet_id,
+                    'username': vet_username,
+                    'email': vet_email,
                     'distance_km': round(distance, 2)
-                })
+                } for vet_id, vet_username, vet_email, distance in nearest
+            ]
+            return JsonResponse(data, safe=False)
+
+        # Only read vets in the farmer's geohash cell and its neighbours, then let
+        # the bounding box discard the corners of those cells
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        candidates = User.objects.filter(
+            is_vet=True, location_lat__range=(min_lat, max_lat), location_lng__isnull=False
+        )
+        if min_lng is not None:
+            candidates = candidates.filter(location_lng__range=(min_lng, max_lng))
+
+        cells = geohash_search_cells(lat, lng, radius_km)
+        if cells is not None:
+            in_cells = Q()
+            for cell in cells:
+                in_cells |= Q(geohash__startswith=cell)
+            candidates = candidates.filter(in_cells)
+        rows = list(candidates.values_list('id', 'username', 'email', 'location_lat', 'location_lng'))
+
+        if not rows:
+            return JsonResponse([], safe=False)
+
+        ids, usernames, emails, lats, lngs = zip(*rows)
+        distances = haversine_km(lat, lng, lats, lngs)
+
+        matches = np.flatnonzero(distances <= radius_km)
+        if sort == 'distance':
+            matches = matches[np.argsort(distances[matches], kind='stable')]
+        if limit is not None:
+            matches = matches[:limit]
+
+        data = [
+            {
+                'id': ids[i],
+                'username': usernames[i],
+                'email': emails[i],
+                'distance_km': round(float(distances[i]), 2)
+            } for i in matches
+        ]
 
         return JsonResponse(data, safe=False)
 
     return HttpResponseNotAllowed(['GET'])
 
+DEFAULT_TOP_K = 3
+MAX_PREDICTION_BATCH = 500
+
+def _parse_top_k(value, loaded):
+    if value is None or value == '':
+        return DEFAULT_TOP_K
+    try:
+        top_k = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("top_k must be an integer.")
+    if top_k < 0 or top_k > len(loaded.disease_mapping):
+        raise ValueError(f"top_k must be between 0 and {len(loaded.disease_mapping)}.")
+    return top_k
+
 @csrf_exempt
 def predict_disease(request):
     if request.method == 'POST':
         try:
             data = request.POST.getlist('symptoms[]')  # Expecting a list of symptoms
-            
-            model_file = os.path.join(settings.BASE_DIR, 'diagnosis/model.pkl')
-            if not os.path.exists(model_file):
-                return JsonResponse({"error": "Model file not found"}, status=500)
-            
-            with open(model_file, 'rb') as f:
-                model, scaler, feature_columns, disease_mapping = pickle.load(f)
 
-            input_data = np.zeros(len(feature_columns))
-            for symptom in data:
-                if symptom in feature_columns:
-                    input_data[feature_columns.index(symptom)] = 1
+            try:
+                loaded = model_registry.get()
+            except ModelNotAvailable as e:
+                return JsonResponse({"error": str(e)}, status=500)
+
+            try:
+                top_k = _parse_top_k(request.POST.get('top_k'), loaded)
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
 
-            input_data = scaler.transform([input_data])
-            prediction = model.predict(input_data)
-            disease_name = {v: k for k, v in disease_mapping.items()}[prediction[0]]
+            result = loaded.predict(data, top_k)
+            result["model_version"] = loaded.version
 
-            return JsonResponse({"predicted_disease": disease_name})
+            return JsonResponse(result)
 
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
     return JsonResponse({"error": "Invalid request method"}, status=400)
 
+@csrf_exempt
+def predict_disease_batch(request):
+    if request.method != 'POST':
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body."}, status=400)
+
+    # Expecting {"items": [["fever", "coughing"], ["diarrhoea"], ...], "top_k": 3}
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not all(
+        isinstance(item, list) and all(isinstance(symptom, str) for symptom in item) for item in items
+    ):
+        return JsonResponse({"error": "'items' must be a list of lists of symptom names."}, status=400)
+
+    if len(items) > MAX_PREDICTION_BATCH:
+        return JsonResponse({"error": f"Maximum of {MAX_PREDICTION_BATCH} items allowed per batch."}, status=400)
+
+    try:
+        loaded = model_registry.get()
+    except ModelNotAvailable as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    try:
+        top_k = _parse_top_k(data.get('top_k'), loaded)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    results = loaded.predict_many(items, top_k)
+    return JsonResponse({"results": results, "model_version": loaded.version})
+
+@csrf_exempt
+def metrics(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    # Prometheus text exposition format; every worker process reports its own numbers
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@csrf_exempt
+def model_info(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    try:
+        return JsonResponse(model_registry.info())
+    except ModelNotAvailable as e:
+        return JsonResponse({"error": str(e)}, status=503)
+
 """
 Reward System 
 Deposit to wallet simply means get money from Mpesa
@@ -406,6 +754,7 @@ MIN_WITHDRAWAL_COINS = 50
 MAX_DEPOSIT_COINS = 10000
 
 @csrf_exempt
+@idempotent
 def deposit_coins(request):
     if request.method != 'POST':
         return HttpResponseBadRequest("Invalid request method.")
@@ -430,21 +779,22 @@ def deposit_coins(request):
 
     coin_reward, _ = CoinReward.objects.get_or_create(user=user)
 
-    # Deduct from wallet and add coins
-    user.wallet_balance -= required_ksh
-    user.save()
-
     try:
-        coin_reward.add_coins(deposit_coins)
+        with transaction.atomic():
+            # Deduct from wallet and add coins
+            user.wallet_balance -= required_ksh
+            user.save()
+
+            coin_reward.add_coins(deposit_coins)
+
+            # ✅ Queue notification
+            enqueue_notifications([
+                (user, f"You deposited {deposit_coins} coins (KES {required_ksh:.2f}) from your wallet."),
+            ])
+            invalidate_account_summaries([user.id])
     except ValueError as e:
         return JsonResponse({'error': str(e)}, status=400)
 
-    # ✅ Create notification
-    Notification.objects.create(
-        recipient=user,
-        message=f"You deposited {deposit_coins} coins (KES {required_ksh:.2f}) from your wallet."
-    )
-
     return JsonResponse({
         'message': f'{deposit_coins} coins deposited successfully.',
         'new_coin_balance': coin_reward.coins,
@@ -452,6 +802,7 @@ def deposit_coins(request):
     })
 
 @csrf_exempt
+@idempotent
 def withdraw_coins(request):
     if request.method != 'POST':
         return HttpResponseBadRequest("Invalid request method.")
@@ -472,23 +823,24 @@ def withdraw_coins(request):
 
     coin_reward, _ = CoinReward.objects.get_or_create(user=user)
 
+    withdrawn_ksh = withdraw_coins / COIN_TO_KSH
+
     try:
-        coin_reward.subtract_coins(withdraw_coins)
+        with transaction.atomic():
+            coin_reward.subtract_coins(withdraw_coins)
+
+            # Update the user's wallet balance
+            user.wallet_balance += withdrawn_ksh
+            user.save()
+
+            # ✅ Queue notification
+            enqueue_notifications([
+                (user, f"You withdrew {withdraw_coins} coins (KES {withdrawn_ksh:.2f}) to your wallet."),
+            ])
+            invalidate_account_summaries([user.id])
     except ValueError as e:
         return JsonResponse({'error': str(e)}, status=400)
 
-    withdrawn_ksh = withdraw_coins / COIN_TO_KSH
-
-    # Update the user's wallet balance
-    user.wallet_balance += withdrawn_ksh
-    user.save()
-
-    # ✅ Create notification
-    Notification.objects.create(
-        recipient=user,
-        message=f"You withdrew {withdraw_coins} coins (KES {withdrawn_ksh:.2f}) to your wallet."
-    )
-
     return JsonResponse({
         'message': f'{withdraw_coins} coins withdrawn successfully. You have received KES {withdrawn_ksh}.',
         'new_coin_balance': coin_reward.coins,
@@ -496,6 +848,7 @@ def withdraw_coins(request):
     })
 
 @csrf_exempt
+@read_only_view
 def get_wallet_balance(request):
     if request.method == 'GET':
         username = request.GET.get('username')  # Get the username from query parameters
@@ -510,6 +863,7 @@ def get_wallet_balance(request):
             return JsonResponse({"error": "User not found."}, status=404)
 
 @csrf_exempt
+@read_only_view
 def get_coin_balance(request):
     if request.method == 'GET':
         username = request.GET.get('username')  # Get the username from query parameters
@@ -517,16 +871,35 @@ def get_coin_balance(request):
         if not username:
             return JsonResponse({"error": "Username is required."}, status=400)
 
+        user = resolve_user(request, username)
+        if not user:
+            return JsonResponse({"error": "User not found."}, status=404)
+
         try:
-            user = User.objects.get(username=username)  # Fetch the user using the username
-            coin_reward = CoinReward.objects.get(user=user)  # Fetch the CoinReward for the user
+            coin_reward = CoinReward.objects.get(user_id=user.id)  # Fetch the CoinReward for the user
             return JsonResponse({"coin_balance": coin_reward.coins}, status=200)
-        except User.DoesNotExist:
-            return JsonResponse({"error": "User not found."}, status=404)
         except CoinReward.DoesNotExist:
             return JsonResponse({"error": "Coin reward record not found."}, status=404)
 
 @csrf_exempt
+@read_only_view
+def account_summary(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    username = request.GET.get('username')
+    if not username:
+        return JsonResponse({"error": "Username is required."}, status=400)
+
+    user = resolve_user(request, username)
+    if not user:
+        return JsonResponse({"error": "User not found."}, status=404)
+
+    # Wallet, coins and pending appointments are cached per user; the unread count is always live
+    return JsonResponse(get_account_summary(user.id))
+
+@csrf_exempt
+@read_only_view
 def favorite_vets(request):
     if request.method == 'GET':
         username = request.GET.get('username')
@@ -534,12 +907,11 @@ def favorite_vets(request):
         if not username:
             return JsonResponse({"error": "Username is required."}, status=400)
         
-        try:
-            user = User.objects.get(username=username)  # Use your custom User model if necessary
-        except User.DoesNotExist:
+        user = resolve_user(request, username)
+        if not user:
             return JsonResponse({'detail': 'User not found.'}, status=404)
 
-        favorites = Favorite.objects.filter(user=user).select_related('favorite_user')
+        favorites = Favorite.objects.filter(user_id=user.id).select_related('favorite_user')
         favorite_vets = [
             {
                 'username': fav.favorite_user.username,